@@ -0,0 +1,132 @@
+"""大量产品被选中时的汇总统计：合计、中位数和10%/90%分位数
+
+所有选中行的历史数据先对齐到按日历日期排列的矩阵（行为产品，列为天，缺失为NaN），
+按上架天数对齐时由该矩阵逐行平移得到，不需要重新读取历史数据。
+"""
+from collections import OrderedDict
+
+import numpy as np
+
+import profiling
+
+QUANTILES = (0.1, 0.5, 0.9)
+
+
+def calendar_matrix(histories, rows):
+    """返回(矩阵, 第一列的天数)，矩阵第i行为rows[i]每天的销量"""
+    rows = np.asarray(rows, dtype=np.intp)
+    starts = histories.offsets[rows]
+    lengths = histories.offsets[rows + 1] - starts
+    # 所有点在days/sales中的位置，以及所属的矩阵行
+    positions = np.repeat(starts - np.cumsum(lengths) + lengths, lengths) + np.arange(lengths.sum())
+    matrix_rows = np.repeat(np.arange(len(rows)), lengths)
+    days = histories.days[positions]
+    first_day = int(days.min())
+    matrix = np.full((len(rows), int(days.max()) - first_day + 1), np.nan, dtype=np.float32)
+    matrix[matrix_rows, days - first_day] = histories.sales[positions]
+    return matrix, first_day
+
+
+def align_to_launch(matrix, first_day, launch_days):
+    """把日历矩阵按每行的上架日期平移，返回(矩阵, 第一列的上架天数)"""
+    offsets = first_day - launch_days
+    shift = offsets - offsets.min()
+    width = matrix.shape[1]
+    aligned = np.full((matrix.shape[0], width + int(shift.max())), np.nan, dtype=np.float32)
+    aligned[np.arange(matrix.shape[0])[:, None], np.arange(width) + shift[:, None]] = matrix
+    return aligned, int(offsets.min())
+
+
+def nan_quantiles(matrix, quantiles):
+    """按列计算忽略NaN的分位数（线性插值），没有数据的列为NaN"""
+    ordered = np.sort(matrix, axis=0)  # NaN排在最后
+    counts = np.count_nonzero(~np.isnan(matrix), axis=0)
+    columns = np.arange(matrix.shape[1])
+    results = []
+    for q in quantiles:
+        position = q * np.maximum(counts - 1, 0)
+        low = np.floor(position).astype(np.intp)
+        high = np.ceil(position).astype(np.intp)
+        fraction = (position - low).astype(np.float32)
+        values = ordered[low, columns] * (1 - fraction) + ordered[high, columns] * fraction
+        values[counts == 0] = np.nan
+        results.append(values)
+    return results
+
+
+def summarize(matrix, first_x):
+    """计算每列的统计量，去掉两端没有任何数据的列"""
+    counts = np.count_nonzero(~np.isnan(matrix), axis=0)
+    present = np.flatnonzero(counts)
+    matrix = matrix[:, present[0]:present[-1] + 1]
+    counts = counts[present[0]:present[-1] + 1]
+    p10, median, p90 = nan_quantiles(matrix, QUANTILES)
+    total = np.nansum(matrix, axis=0)
+    total[counts == 0] = np.nan
+    return {
+        'x': first_x + present[0] + np.arange(matrix.shape[1]),
+        'sum': total,
+        'median': median,
+        'p10': p10,
+        'p90': p90,
+        'count': counts,
+    }
+
+
+class AggregateCache:
+    """按选中行集合缓存日历矩阵和两种对齐方式的统计结果
+
+    切换按日历或按上架天数对齐时，只需平移已缓存的矩阵。
+    数据集追加或替换历史数据后，旧的结果自动失效。
+    """
+
+    def __init__(self, max_entries=4):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+
+    def get(self, dataset, rows, by_launch):
+        """返回汇总结果字典，rows中没有历史数据的行被忽略，全部没有时返回None"""
+        key = frozenset(rows)
+        entry = self._entries.get(key)
+        if entry is None or entry['histories'] is not dataset.histories:
+            entry = self._build(dataset, rows)
+            if entry is None:
+                return None
+            self._entries[key] = entry
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        self._entries.move_to_end(key)
+
+        result = entry['results'].get(by_launch)
+        if result is None:
+            with profiling.span('aggregate.stats', by_launch=by_launch):
+                if by_launch:
+                    matrix, first_x = align_to_launch(entry['matrix'], entry['first_day'],
+                                                      entry['launch_days'])
+                else:
+                    matrix, first_x = entry['matrix'], entry['first_day']
+                result = summarize(matrix, first_x)
+                result.update(rows=entry['rows'], by_launch=by_launch)
+            entry['results'][by_launch] = result
+        return result
+
+    def _build(self, dataset, rows):
+        histories = dataset.histories
+        rows = np.array(sorted(row for row in rows if histories.has_history(row)), dtype=np.intp)
+        if len(rows) == 0:
+            return None
+        with profiling.span('aggregate.matrix', rows=len(rows)):
+            matrix, first_day = calendar_matrix(histories, rows)
+            launch = dataset.launch_days(rows)
+            # 没有上架日期的产品从第一天数据算起
+            missing = np.isnat(launch)
+            if missing.any():
+                launch[missing] = [histories.day_offsets(row).min() for row in rows[missing]]
+        return {
+            'histories': histories,
+            'rows': len(rows),
+            'matrix': matrix,
+            'first_day': first_day,
+            'launch_days': launch.astype(np.int64),
+            'results': {},
+        }
@@ -0,0 +1,45 @@
+"""比较工作簿冷打开（解析xlsx）与热打开（读取列式缓存）的耗时
+
+用法: python benchmarks/bench_cache.py --rows 5000 --days 365
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from dataset import ExcelDataset  # noqa: E402
+from workbook_cache import WorkbookCache  # noqa: E402
+from generate_workbook import generate_workbook  # noqa: E402
+
+
+def timed(func):
+    start = time.perf_counter()
+    result = func()
+    return time.perf_counter() - start, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description='工作簿缓存基准测试')
+    parser.add_argument('--rows', type=int, default=5000)
+    parser.add_argument('--days', type=int, default=365)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'bench.xlsx')
+        generate_workbook(path, args.rows, args.days)
+        print(f"工作簿: {args.rows}行 x {args.days}天, {os.path.getsize(path) / 1e6:.1f} MB")
+
+        cache = WorkbookCache(cache_dir=os.path.join(tmp, 'cache'))
+        cold, _ = timed(lambda: ExcelDataset.load(path, cache))
+        print(f"冷打开(解析xlsx并写缓存): {cold:.2f}s")
+
+        warm = min(timed(lambda: ExcelDataset.load(path, cache))[0] for _ in range(args.repeat))
+        print(f"热打开(读取缓存): {warm:.3f}s  加速 {cold / warm:.0f}x")
+
+
+if __name__ == '__main__':
+    main()
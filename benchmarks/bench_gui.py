@@ -0,0 +1,172 @@
+"""在离屏模式下驱动MainWindow，测量打开文件、填充表格、选中行到图表绘制、图片单元格的耗时
+
+结果保存为JSON，指定--baseline时与之前的结果比较，变慢超过阈值时返回1。
+
+用法:
+    python benchmarks/bench_gui.py --rows 5000 --days 365 --out results.json
+    python benchmarks/bench_gui.py --rows 5000 --days 365 --baseline results.json
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+import warnings
+
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from generate_workbook import generate_workbook  # noqa: E402
+from results import add_arguments, report  # noqa: E402
+
+# 没有中文字体的环境中会为每个汉字输出警告
+warnings.filterwarnings('ignore', message='Glyph .* missing')
+
+
+def wait_until(app, condition, timeout=600):
+    """处理事件直到condition()为真"""
+    deadline = time.perf_counter() + timeout
+    while not condition():
+        if time.perf_counter() > deadline:
+            raise TimeoutError('等待超时')
+        app.processEvents()
+        time.sleep(0.001)
+
+
+def timed(func):
+    start = time.perf_counter()
+    func()
+    return time.perf_counter() - start
+
+
+def write_images(window, dataset):
+    """为每个图片链接生成本地图片，避免测试时访问网络"""
+    from PyQt5.QtGui import QColor, QImage
+    image = QImage(600, 600, QImage.Format_RGB32)
+    image.fill(QColor('#8c564b'))
+    path = os.path.join(tempfile.gettempdir(), 'bench_image.jpg')
+    image.save(path, 'JPG')
+    with open(path, 'rb') as f:
+        data = f.read()
+    window.image_store.put_many((url, data) for url in dataset.df.iloc[:, dataset.image_col])
+
+
+def run(args, workbook):
+    from PyQt5.QtWidgets import QApplication
+    import main
+
+    app = QApplication.instance() or QApplication([])
+    window = main.MainWindow()
+    window.resize(1600, 900)
+    window.show()
+    app.processEvents()
+    results = {}
+
+    def settle():
+        """处理事件直到图表按最新的选中状态绘制完成"""
+        app.processEvents()
+        wait_until(app, window.chart_scheduler.is_idle)
+        app.processEvents()
+
+    def select(rows):
+        window.table.selectionModel().clearSelection()
+        settle()
+        for row in rows:
+            window.table.selectRow(row)
+        settle()
+
+    # 冷打开：后台分批读取xlsx，记录首批行出现和全部读完的时间
+    start = time.perf_counter()
+    window.load_excel_file(workbook)
+    wait_until(app, lambda: window.table_model.rowCount() > 0)
+    results['table_first_rows'] = time.perf_counter() - start
+    wait_until(app, lambda: window.loader is None)
+    results['open_cold'] = time.perf_counter() - start
+    dataset = window.dataset
+    write_images(window, dataset)
+
+    # 热打开：从列式缓存读取并重建表格
+    samples = []
+    for _ in range(args.repeat):
+        window.dataset = None
+        samples.append(timed(lambda: (window.load_excel_file(workbook), settle())))
+    results['open_warm'] = statistics.median(samples)
+
+    # 单选：清空后选中一行，到图表重绘完成
+    samples = []
+    for i in range(args.repeat):
+        select([])
+        samples.append(timed(lambda: (window.table.selectRow(i), settle())))
+    results['select_single'] = statistics.median(samples)
+
+    # 多选：逐行追加选中，取每次追加的中位数
+    select([])
+    rows = range(min(args.multi, len(dataset)))
+    samples = [timed(lambda: (window.table.selectRow(row), settle())) for row in rows]
+    results['select_multi_step'] = statistics.median(samples)
+
+    # 全选：点击ASIN表头
+    samples = []
+    for _ in range(args.repeat):
+        select([])
+        samples.append(timed(lambda: (window.on_header_clicked(dataset.asin_col), settle())))
+    results['select_all'] = statistics.median(samples)
+    select([])
+
+    # 筛选和排序：第一次包括建立索引
+    window.search_edit.setText('cat toy')
+    results['filter_title_first'] = timed(lambda: (window.apply_filter(), settle()))
+    results['filter_title'] = statistics.median(
+        timed(lambda: (window.apply_filter(), settle())) for _ in range(args.repeat))
+    window.search_edit.setText('')
+    results['sort_launch_date'] = statistics.median(
+        timed(lambda: (window.on_header_clicked(dataset.launch_date_col), settle()))
+        for _ in range(args.repeat))
+    window.clear_filter()
+    settle()
+
+    # 图片单元格：第一次需要缩放原图并写缩略图，之后从内存读取
+    window.thumbnails._pixmaps.clear()
+    window.thumbnails._missing.clear()
+    viewport = window.table.viewport()
+    results['image_cells_first'] = timed(viewport.repaint)
+    results['image_cells_cached'] = statistics.median(timed(viewport.repaint) for _ in range(args.repeat))
+
+    # 滚动到末尾并重绘可见单元格
+    scroll_bar = window.table.verticalScrollBar()
+    results['scroll_to_end'] = timed(lambda: (scroll_bar.setValue(scroll_bar.maximum()),
+                                              viewport.repaint(), app.processEvents()))
+
+    window.close()
+    app.processEvents()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description='界面性能基准测试')
+    parser.add_argument('--rows', type=int, default=5000)
+    parser.add_argument('--days', type=int, default=365)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--multi', type=int, default=10, help='多选测试中逐个选中的行数')
+    add_arguments(parser)
+    args = parser.parse_args()
+    cwd = os.getcwd()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        workbook = os.path.join(tmp, 'bench.xlsx')
+        generate_workbook(workbook, args.rows, args.days, args.seed)
+        # 设置、缓存和图片目录都放在临时目录中，不影响本机的数据
+        os.environ['HOME'] = tmp
+        os.chdir(tmp)
+        metrics = run(args, workbook)
+        os.chdir(cwd)
+
+    return report(args, metrics, rows=args.rows, days=args.days, seed=args.seed)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,113 @@
+"""测量启动耗时：导入main模块的时间，从启动进程到主窗口第一次绘制的时间，以及到图表创建完成的时间
+
+图表应在窗口第一次绘制之后才创建，否则返回1。
+
+每次测量都在新进程中进行，取多次的中位数。结果保存为JSON，指定--baseline时与之前的结果比较，
+变慢超过阈值时返回1。
+
+用法:
+    python benchmarks/bench_startup.py --out startup.json
+    python benchmarks/bench_startup.py --baseline startup.json
+"""
+import argparse
+import json
+import os
+import re
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+from results import add_arguments, report
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# 在子进程中运行：显示主窗口，输出第一次绘制和图表创建完成时距进程启动的秒数，
+# 以及第一次绘制时图表是否已经创建，然后退出
+STARTUP_SCRIPT = '''
+import json, os, sys, time
+sys.path.insert(0, {root!r})
+from PyQt5.QtCore import QEvent, QObject, QTimer
+from PyQt5.QtWidgets import QApplication
+import main
+
+start = float(os.environ['STARTUP_T0'])
+result = {{}}
+
+class FirstPaint(QObject):
+    def eventFilter(self, obj, event):
+        if event.type() == QEvent.Paint and 'first_paint' not in result:
+            result['first_paint'] = time.time() - start
+            result['chart_before_paint'] = window._chart is not None
+        return False
+
+def check_chart():
+    if 'first_paint' in result and window._chart is not None:
+        result['chart_ready'] = time.time() - start
+        print(json.dumps(result), flush=True)
+        os._exit(0)
+
+app = QApplication(sys.argv)
+window = main.MainWindow()
+first_paint = FirstPaint()
+window.installEventFilter(first_paint)
+timer = QTimer()
+timer.timeout.connect(check_chart)
+timer.start(1)
+window.show()
+app.exec_()
+'''
+
+
+def import_time(env):
+    """-X importtime输出的main模块累计导入时间（秒）"""
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', 'import main'],
+                            cwd=ROOT, env=env, capture_output=True, text=True, check=True)
+    for line in result.stderr.splitlines():
+        match = re.match(r'import time:\s+\d+ \|\s+(\d+) \| main$', line)
+        if match:
+            return int(match.group(1)) / 1e6
+    raise RuntimeError('没有找到main模块的导入时间')
+
+
+def startup_times(env, cwd):
+    """返回{'first_paint', 'chart_ready': 距启动进程的秒数, 'chart_before_paint': 图表是否在第一次绘制前创建}"""
+    env = dict(env, STARTUP_T0=repr(time.time()))
+    result = subprocess.run([sys.executable, '-c', STARTUP_SCRIPT.format(root=ROOT)],
+                            cwd=cwd, env=env, capture_output=True, text=True, timeout=120)
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr)
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description='启动耗时基准测试')
+    parser.add_argument('--repeat', type=int, default=5)
+    add_arguments(parser)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        # 设置和图片库都放在临时目录中，不影响本机的数据
+        env = dict(os.environ, HOME=tmp)
+        env.setdefault('QT_QPA_PLATFORM', 'offscreen')
+        # 第一次运行包括编译.pyc，不计入结果
+        import_time(env)
+        startup_times(env, tmp)
+        runs = [startup_times(env, tmp) for _ in range(args.repeat)]
+        metrics = {
+            'import_main': statistics.median(import_time(env) for _ in range(args.repeat)),
+            'first_paint': statistics.median(run['first_paint'] for run in runs),
+            'chart_ready': statistics.median(run['chart_ready'] for run in runs),
+        }
+
+    status = report(args, metrics, repeat=args.repeat)
+    early = sum(run['chart_before_paint'] for run in runs)
+    if early:
+        print(f"错误: {early}/{len(runs)}次启动时图表在窗口第一次绘制之前创建")
+        return 1
+    return status
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,71 @@
+"""生成与示例数据.xlsx结构相同的测试工作簿
+
+用法: python benchmarks/generate_workbook.py --rows 5000 --days 365 --out large.xlsx
+"""
+import argparse
+import datetime
+import json
+import random
+import string
+
+from openpyxl import Workbook
+
+COLUMNS = ['ASIN', '标题', '图片链接', '类目路径', '上架日期',
+           '历史数据-卖家精灵', '历史数据-junglescout', '历史数据-异常']
+
+# Excel单元格最多容纳的字符数，历史数据过长会被截断
+EXCEL_CELL_LIMIT = 32767
+
+WORDS = ['Cat', 'Dog', 'Pet', 'Silicone', 'Claw', 'Covers', 'Toy', 'Bed', 'Brush',
+         'Grooming', 'Kitten', 'Puppy', 'Shoes', 'Protector', 'Feeder', 'Water']
+
+
+def random_history(rng, launch_date, days):
+    """生成junglescout格式的历史数据字符串，包含&#10;换行和null销量"""
+    start = launch_date - datetime.timedelta(days=rng.randint(0, 3))
+    dates = [(start + datetime.timedelta(days=i)).strftime('%Y/%m/%d') for i in range(days)]
+    level = rng.uniform(1, 500)
+    sales = []
+    for _ in range(days):
+        level = min(max(level * rng.uniform(0.85, 1.18), 1.0), 5000.0)
+        sales.append(None if rng.random() < 0.05 else int(level))
+    history = {'days': dates, 'prices': [None] * days, 'sales': sales}
+    body = ',&#10;    '.join(f'"{k}": {json.dumps(v)}' for k, v in history.items())
+    text = '{&#10;    ' + body + '&#10;}'
+    if len(text) > EXCEL_CELL_LIMIT:
+        raise ValueError(f"{days}天的历史数据超过Excel单元格的{EXCEL_CELL_LIMIT}字符上限")
+    return text
+
+
+def generate_workbook(path, rows, days, seed=0):
+    """生成rows行、每行days天历史数据的工作簿"""
+    rng = random.Random(seed)
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet()
+    ws.append(COLUMNS)
+    base = datetime.datetime(2023, 1, 1)
+    for i in range(rows):
+        asin = 'B0' + ''.join(rng.choices(string.ascii_uppercase + string.digits, k=8))
+        title = ' '.join(rng.choices(WORDS, k=rng.randint(6, 20)))
+        launch_date = base + datetime.timedelta(days=rng.randint(0, 600))
+        ws.append([
+            asin,
+            title,
+            f'https://example.com/images/{asin}_{i}.jpg',
+            'Pet Supplies:Cats:Grooming',
+            launch_date,
+            None,
+            random_history(rng, launch_date, days),
+            None,
+        ])
+    wb.save(path)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='生成测试工作簿')
+    parser.add_argument('--rows', type=int, default=5000)
+    parser.add_argument('--days', type=int, default=365)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--out', default='generated.xlsx')
+    args = parser.parse_args()
+    generate_workbook(args.out, args.rows, args.days, args.seed)
@@ -0,0 +1,58 @@
+"""基准测试结果的保存和比较，各基准测试脚本共用同一个退化判断规则"""
+import datetime
+import json
+import platform
+
+# 比基准慢不到该秒数时视为噪声，不算变慢
+NOISE_FLOOR = 0.005
+
+
+def add_arguments(parser):
+    """添加--out、--baseline和--threshold参数"""
+    parser.add_argument('--out', default=None, help='保存结果的JSON文件')
+    parser.add_argument('--baseline', default=None, help='用于比较的JSON结果文件')
+    parser.add_argument('--threshold', type=float, default=0.2, help='允许变慢的比例')
+
+
+def compare(results, baseline, threshold):
+    """返回变慢超过阈值的指标列表: (名称, 基准, 本次)"""
+    regressions = []
+    for name, base in baseline.get('metrics', {}).items():
+        current = results.get(name)
+        if current is None:
+            continue
+        if current > base * (1 + threshold) and current - base > NOISE_FLOOR:
+            regressions.append((name, base, current))
+    return regressions
+
+
+def report(args, metrics, **meta):
+    """输出各指标，按参数保存结果并与基准比较，返回进程退出码（有退化时为1）
+
+    meta为本次测试的参数（如工作簿大小），与基准结果中的不同时输出警告。
+    """
+    output = {
+        'meta': dict(meta,
+                     python=platform.python_version(),
+                     platform=platform.platform(),
+                     time=datetime.datetime.now().isoformat(timespec='seconds')),
+        'metrics': metrics,
+    }
+    for name, value in metrics.items():
+        print(f"{name:20s} {value * 1000:10.1f} ms")
+    if args.out:
+        with open(args.out, 'w', encoding='utf-8') as f:
+            json.dump(output, f, ensure_ascii=False, indent=2)
+
+    if args.baseline:
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+        if any(baseline['meta'].get(name) != value for name, value in meta.items()):
+            print("警告: 基准结果的测试参数与本次不同")
+        regressions = compare(metrics, baseline, args.threshold)
+        for name, base, current in regressions:
+            print(f"变慢: {name} {base * 1000:.1f} ms -> {current * 1000:.1f} ms")
+        if regressions:
+            return 1
+        print(f"没有超过{args.threshold:.0%}的性能退化")
+    return 0
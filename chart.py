@@ -0,0 +1,248 @@
+import numpy as np
+import pandas as pd
+from matplotlib.dates import DateFormatter, date2num
+from matplotlib.lines import Line2D
+
+import profiling
+from lod import minmax_downsample, visible_slice
+
+# 图例最多显示的产品数，图例的绘制耗时随条目数增长
+LEGEND_MAX_ENTRIES = 20
+
+# 可见数据点的平均间距小于该像素数时不再绘制数据点标记
+MARKER_SPACING_PX = 6
+
+
+def compute_xlim(launch_dates, first_data_dates, last_data_dates, start_from_launch_date=True):
+    """计算x轴范围：从最早上架日期（或最早数据日期）到最晚数据日期"""
+    start_date = min(launch_dates if start_from_launch_date else first_data_dates)
+    return start_date, max(last_data_dates)
+
+
+def series_for_row(dataset, row, colors):
+    """返回某行的绘图数据，没有历史数据时返回None
+
+    colors为ColorAssigner，只为有历史数据的行分配颜色。
+    """
+    history = dataset.history(row)
+    if history is None:
+        return None
+    dates, sales = history
+    asin = dataset.asin(row)
+    return {
+        'asin': asin,
+        'title': dataset.title(row)[:30] + '...',  # 添加标题前30个字符
+        'dates': dates,
+        'sales': sales,
+        'color': colors.color_for(asin),
+        'launch_date': dataset.launch_date(row),
+    }
+
+
+def series_xlim(series, start_from_launch_date=True):
+    """由series_for_row()返回的绘图数据计算x轴范围，没有上架日期的产品从第一天数据开始"""
+    return compute_xlim([data['dates'].min() if pd.isna(data['launch_date']) else data['launch_date']
+                         for data in series],
+                        [data['dates'].min() for data in series],
+                        [data['dates'].max() for data in series],
+                        start_from_launch_date)
+
+
+class SalesChart:
+    """销量趋势图
+
+    按ASIN保存已绘制的曲线，选中的产品变化时只增删有变化的曲线，
+    并通过draw_idle合并重绘请求。
+
+    曲线只绘制可见范围内、按画布宽度降采样后的数据，缩放、平移或改变窗口大小时
+    重新计算；raw为True时绘制全部原始数据。
+
+    选中的产品很多时用show_aggregate()显示汇总，只绘制分位数区间、中位数和合计三个图形。
+    """
+
+    def __init__(self, figure, canvas, font, raw=False):
+        self.figure = figure
+        self.canvas = canvas
+        self.font = font
+        self.raw = raw
+        self.ax = figure.add_subplot(111)
+        # ASIN -> Line2D
+        self.lines = {}
+        # ASIN -> 按日期排序的完整数据(x, y)，x为matplotlib日期数值
+        self._series_data = {}
+        # 当前显示的内容: None（提示信息）、'lines'（每个产品一条曲线）或'aggregate'（汇总）
+        self._mode = None
+        # 汇总模式下显示合计的右侧y轴
+        self._sum_ax = None
+        self.canvas.mpl_connect('resize_event', lambda event: self._refresh_lod())
+        self.clear()
+
+    def clear(self):
+        """清空图表，显示提示信息"""
+        ax = self._reset_axes()
+        self._mode = None
+        ax.set_xlabel('时间', fontproperties=self.font)
+        ax.set_ylabel('销量', fontproperties=self.font)
+        ax.set_title('点击表格行显示销量趋势', fontproperties=self.font)
+        self.figure.tight_layout()
+        self.canvas.draw_idle()
+
+    def _reset_axes(self):
+        """清除所有曲线和合计坐标轴"""
+        if self._sum_ax is not None:
+            self._sum_ax.remove()
+            self._sum_ax = None
+        self.ax.clear()
+        self.lines.clear()
+        self._series_data.clear()
+        return self.ax
+
+    def _setup_axes(self):
+        """第一次绘制曲线时设置坐标轴样式，之后增删曲线时不再重复设置"""
+        ax = self._reset_axes()
+        ax.set_xlabel('时间', fontproperties=self.font)
+        ax.set_ylabel('销量', fontproperties=self.font)
+        ax.set_title('多产品销量趋势对比', fontproperties=self.font)
+
+        # 设置x轴时间格式
+        ax.xaxis_date()
+        ax.xaxis.set_major_formatter(DateFormatter('%Y/%m/%d'))
+        ax.xaxis.set_tick_params(labelrotation=-45)
+
+        # 添加网格
+        ax.grid(True, linestyle='--', alpha=0.7)
+
+        # 缩放或平移后按新的范围重新降采样（ax.clear()会清除回调，需要重新连接）
+        ax.callbacks.connect('xlim_changed', lambda ax: self._refresh_lod())
+        self._mode = 'lines'
+
+    def update(self, series, xlim):
+        """显示series中的曲线
+
+        series为字典列表，包含asin、title、dates、sales、color，同一ASIN只绘制第一条。
+        """
+        if not series:
+            self.clear()
+            return
+
+        relayout = self._mode != 'lines'
+        if relayout:
+            self._setup_axes()
+
+        wanted = {}
+        for data in series:
+            wanted.setdefault(data['asin'], data)
+
+        # 删除不再选中的曲线
+        for asin in [asin for asin in self.lines if asin not in wanted]:
+            self.lines.pop(asin).remove()
+            del self._series_data[asin]
+
+        # 只绘制新选中的曲线
+        with profiling.span('chart.plot'):
+            for asin, data in wanted.items():
+                if asin not in self.lines:
+                    x = date2num(data['dates'])
+                    y = np.asarray(data['sales'])
+                    if np.any(np.diff(x) < 0):
+                        order = np.argsort(x, kind='stable')
+                        x, y = x[order], y[order]
+                    self._series_data[asin] = (x, y)
+                    self.lines[asin], = self.ax.plot(
+                        x, y, '-o',
+                        label=f"{data['asin']}\n{data['title']}",
+                        color=data['color'],
+                        linewidth=2,
+                        markersize=4)
+
+        self._update_limits(xlim)
+        with profiling.span('chart.lod'):
+            self._refresh_lod()
+        with profiling.span('chart.legend'):
+            self._update_legend([self.lines[asin] for asin in wanted])
+        if relayout:
+            with profiling.span('chart.tight_layout'):
+                self.figure.tight_layout()
+        self.canvas.draw_idle()
+
+    def invalidate(self, asins):
+        """删除这些ASIN的曲线，下次update()时按新数据重新绘制"""
+        for asin in asins:
+            line = self.lines.pop(asin, None)
+            if line is not None:
+                line.remove()
+                del self._series_data[asin]
+
+    def show_aggregate(self, aggregate):
+        """显示aggregate.AggregateCache返回的汇总结果"""
+        ax = self._reset_axes()
+        self._mode = 'aggregate'
+        by_launch = aggregate['by_launch']
+        if by_launch:
+            x = aggregate['x']
+            ax.set_xlabel('上架天数', fontproperties=self.font)
+        else:
+            x = date2num(aggregate['x'].astype('datetime64[D]'))
+            ax.set_xlabel('时间', fontproperties=self.font)
+            ax.xaxis_date()
+            ax.xaxis.set_major_formatter(DateFormatter('%Y/%m/%d'))
+            ax.xaxis.set_tick_params(labelrotation=-45)
+        ax.set_ylabel('销量', fontproperties=self.font)
+        ax.set_title(f"{aggregate['rows']}个产品销量汇总", fontproperties=self.font)
+        ax.grid(True, linestyle='--', alpha=0.7)
+
+        with profiling.span('chart.aggregate'):
+            band = ax.fill_between(x, aggregate['p10'], aggregate['p90'], color='#1f77b4',
+                                   alpha=0.25, linewidth=0, label='10%-90%分位')
+            median, = ax.plot(x, aggregate['median'], color='#1f77b4', linewidth=2, label='中位数')
+            ax.set_xlim(x[0], x[-1])
+            top = np.nanmax(aggregate['p90'])
+            ax.set_ylim(0, top * 1.05 if top > 0 else 1)
+
+            # 合计与单个产品的量级不同，使用右侧的y轴
+            self._sum_ax = ax.twinx()
+            total, = self._sum_ax.plot(x, aggregate['sum'], color='#ff7f0e', linewidth=1.5,
+                                       label='合计')
+            self._sum_ax.set_ylabel('合计销量', fontproperties=self.font)
+            self._sum_ax.set_ylim(bottom=0)
+            ax.legend(handles=[median, band, total], prop=self.font, loc='upper left')
+            self.figure.tight_layout()
+        self.canvas.draw_idle()
+
+    def _update_legend(self, handles):
+        """重建图例，超过LEGEND_MAX_ENTRIES条时只显示前面的产品和总数"""
+        if len(handles) > LEGEND_MAX_ENTRIES:
+            more = Line2D([], [], linestyle='none', label=f"... 共{len(handles)}个产品")
+            handles = handles[:LEGEND_MAX_ENTRIES] + [more]
+        self.ax.legend(handles=handles, prop=self.font)
+
+    def _update_limits(self, xlim):
+        ax = self.ax
+        # 根据完整数据计算y轴范围，下限固定为0，上方留5%空白
+        top = max((float(y.max()) for _, y in self._series_data.values() if len(y)), default=0)
+        ax.set_ylim(0, top * 1.05 if top > 0 else 1)
+        ax.set_xlim(*xlim)
+
+    def set_raw(self, raw):
+        """切换是否绘制全部原始数据"""
+        self.raw = raw
+        self._refresh_lod()
+        self.canvas.draw_idle()
+
+    def _refresh_lod(self):
+        """按当前x轴范围和画布宽度更新每条曲线实际绘制的数据"""
+        if not self.lines:
+            return
+        x0, x1 = self.ax.get_xlim()
+        width = max(int(self.ax.bbox.width), 100)
+        for asin, line in self.lines.items():
+            x, y = self._series_data[asin]
+            if self.raw:
+                line.set_data(x, y)
+                line.set_marker('o')
+                continue
+            window = visible_slice(x, x0, x1)
+            line.set_data(*minmax_downsample(x[window], y[window], width // 2))
+            # 数据点过密时标记会连成一片，只画折线
+            dense = window.stop - window.start > width / MARKER_SPACING_PX
+            line.set_marker('' if dense else 'o')
@@ -0,0 +1,31 @@
+"""界面中的图表画布和工具栏
+
+导入Qt5Agg后端和pyplot需要数百毫秒，主窗口在第一次显示图表时才导入本模块。
+"""
+import matplotlib
+from matplotlib.backends.backend_qt5agg import FigureCanvasQTAgg as FigureCanvas
+from matplotlib.backends.backend_qt5agg import NavigationToolbar2QT as NavigationToolbar
+from matplotlib.figure import Figure
+
+import profiling
+
+# 设置matplotlib中文字体
+matplotlib.rcParams['font.sans-serif'] = ['PingFang HK', 'Arial Unicode MS']  # Mac常用中文字体
+matplotlib.rcParams['axes.unicode_minus'] = False
+matplotlib.rcParams['font.family'] = 'sans-serif'
+
+
+class ProfiledCanvas(FigureCanvas):
+    """记录每次重绘耗时的画布"""
+    
+    def draw(self):
+        with profiling.span('canvas.draw'):
+            super().draw()
+
+
+def create_chart_canvas(parent):
+    """返回(图表, 画布, 工具栏)"""
+    figure = Figure(figsize=(6, 4))
+    canvas = ProfiledCanvas(figure)
+    toolbar = NavigationToolbar(canvas, parent)
+    return figure, canvas, toolbar
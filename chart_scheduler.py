@@ -0,0 +1,80 @@
+import threading
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+
+from PyQt5.QtCore import QObject, QTimer, pyqtSignal
+
+
+class ChartScheduler(QObject):
+    """合并连续的选中变化，在后台线程中准备绘图数据，只把最新的结果交给界面线程
+
+    schedule()在每次选中变化时调用。空闲时在下一次事件循环中开始准备（同一次事件处理中的
+    多次变化只准备一次）；正在准备或等待时又有变化（如拖动选择），等停止变化delay毫秒后再开始。
+    snapshot()在界面线程中读取选中行等状态，prepare(请求, cancelled)在后台线程中解码历史数据、
+    对齐日期和分配颜色，cancelled()为真表示结果已过时，可以提前返回。
+    过时的结果被丢弃，最新的结果通过result_ready信号在界面线程中发出。
+    """
+
+    # 最新选中状态的绘图数据，由prepare返回
+    result_ready = pyqtSignal(object)
+    # 后台任务结束: (任务编号, 结果，过时或失败时为None)
+    _done = pyqtSignal(int, object)
+
+    def __init__(self, snapshot, prepare, delay=50, parent=None):
+        super().__init__(parent)
+        self.snapshot = snapshot
+        self.prepare = prepare
+        self.delay = delay
+        self._generation = 0
+        self._running = 0
+        self._timer = QTimer(self)
+        self._timer.setSingleShot(True)
+        self._timer.timeout.connect(self._submit)
+        self._done.connect(self._on_done)
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='chart-prepare')
+
+    def schedule(self):
+        """选中状态变化，之前的任务和结果都已过时"""
+        self._generation += 1
+        if self._timer.isActive() and self._timer.interval() == 0:
+            # 已安排在下一次事件循环中开始，届时读取的是最新状态
+            return
+        busy = self._running or self._timer.isActive()
+        self._timer.start(self.delay if busy else 0)
+
+    def is_idle(self):
+        """没有等待开始或正在准备的任务"""
+        return not self._timer.isActive() and self._running == 0
+
+    def shutdown(self):
+        self._timer.stop()
+        self._generation += 1
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def _submit(self):
+        generation = self._generation
+        try:
+            request = self.snapshot()
+        except Exception as e:
+            print(f"更新图表时出错: {str(e)}")
+            traceback.print_exc()
+            return
+        self._running += 1
+        self._executor.submit(self._run, generation, request)
+
+    def _run(self, generation, request):
+        threading.current_thread().name = 'chart-prepare'
+        result = None
+        cancelled = lambda: generation != self._generation  # noqa: E731
+        if not cancelled():
+            try:
+                result = self.prepare(request, cancelled)
+            except Exception as e:
+                print(f"更新图表时出错: {str(e)}")
+                traceback.print_exc()
+        self._done.emit(generation, result)
+
+    def _on_done(self, generation, result):
+        self._running -= 1
+        if generation == self._generation and result is not None:
+            self.result_ready.emit(result)
@@ -0,0 +1,59 @@
+import threading
+
+PALETTE = [
+    '#1f77b4',  # 蓝色
+    '#ff7f0e',  # 橙色
+    '#2ca02c',  # 绿色
+    '#d62728',  # 红色
+    '#9467bd',  # 紫色
+    '#8c564b',  # 棕色
+    '#e377c2',  # 粉色
+    '#7f7f7f',  # 灰色
+    '#bcbd22',  # 黄绿色
+    '#17becf',  # 青色
+    '#ff9896',  # 浅红色
+    '#98df8a',  # 浅绿色
+    '#c5b0d5',  # 浅紫色
+    '#c49c94',  # 浅棕色
+    '#f7b6d2',  # 浅粉色
+    '#dbdb8d',  # 浅黄色
+    '#9edae5',  # 浅青色
+    '#ad494a',  # 深红色
+    '#8c6d31',  # 深黄色
+    '#bd9e39'   # 金色
+]
+
+
+class ColorAssigner:
+    """为每个ASIN分配固定的颜色，按调色板顺序使用，用完后从头开始
+
+    可以在多个线程中同时使用，分配新颜色时加锁。
+    """
+
+    def __init__(self, palette=PALETTE):
+        self.palette = palette
+        self.asin_colors = {}
+        self.used_color_indices = set()
+        self._lock = threading.Lock()
+
+    def color_for(self, asin):
+        """返回ASIN的颜色，第一次出现时分配下一个未使用的颜色"""
+        color = self.asin_colors.get(asin)
+        if color is None:
+            with self._lock:
+                color = self.asin_colors.get(asin)
+                if color is None:
+                    color = self.asin_colors[asin] = self._next_color()
+        return color
+
+    def _next_color(self):
+        # 如果所有颜色都用完了，重置使用记录
+        if len(self.used_color_indices) >= len(self.palette):
+            self.used_color_indices.clear()
+
+        # 找到第一个未使用的颜色
+        for i in range(len(self.palette)):
+            if i not in self.used_color_indices:
+                self.used_color_indices.add(i)
+                return self.palette[i]
+        return self.palette[0]
@@ -0,0 +1,124 @@
+import copy
+import os
+
+import numpy as np
+import pandas as pd
+
+import profiling
+from history_store import HistoryStore
+
+# 工作簿中用到的列名
+ASIN_COLUMN = "ASIN"
+IMAGE_COLUMN = "图片链接"
+LAUNCH_DATE_COLUMN = "上架日期"
+HISTORY_COLUMN = "历史数据-junglescout"
+TITLE_COLUMN = "标题"
+
+
+def file_signature(file_path):
+    """返回文件的(修改时间, 大小)，用于判断文件是否变化"""
+    stat = os.stat(file_path)
+    return stat.st_mtime_ns, stat.st_size
+
+
+def find_column(columns, name):
+    """按去除空格后的列名查找列索引，找不到时返回None"""
+    for i, column in enumerate(columns):
+        if str(column).strip() == name:
+            return i
+    return None
+
+
+class ExcelDataset:
+    """工作簿的内存数据集，只在打开文件时解析一次
+
+    用load()同步读取；后台分批读取时先用streaming()创建空数据集，
+    再用append_rows()追加，全部读完前complete为False。
+    """
+
+    def __init__(self, file_path, df, histories, complete=True):
+        self.file_path = file_path
+        self.signature = file_signature(file_path)
+        self.df = df
+        self.histories = histories
+        self.complete = complete
+
+        # 常用列的索引
+        columns = self.df.columns
+        self.asin_col = columns.get_loc(ASIN_COLUMN)
+        self.image_col = columns.get_loc(IMAGE_COLUMN)
+        self.launch_date_col = columns.get_loc(LAUNCH_DATE_COLUMN)
+        self.history_col = columns.get_loc(HISTORY_COLUMN)
+        # 导出的标题列名可能带有空格，如" 标题"
+        self.title_col = find_column(columns, TITLE_COLUMN)
+
+    @classmethod
+    def load(cls, file_path, cache=None):
+        """读取整个工作簿，传入cache时优先从列式缓存读取，未命中则解析xlsx并写回缓存"""
+        cached = cache.load(file_path) if cache is not None else None
+        if cached is not None:
+            return cls(file_path, *cached)
+        with profiling.span('xlsx.read_excel'):
+            df = pd.read_excel(file_path)
+        # 一次解析全部历史数据
+        histories = HistoryStore.from_json(df.iloc[:, df.columns.get_loc(HISTORY_COLUMN)].tolist())
+        if cache is not None:
+            cache.store(file_path, df, histories)
+        return cls(file_path, df, histories)
+
+    @classmethod
+    def streaming(cls, file_path, columns):
+        """只有表头的空数据集，之后由append_rows()逐批追加"""
+        return cls(file_path, pd.DataFrame(columns=columns), HistoryStore.empty(), complete=False)
+
+    def append_rows(self, rows, histories):
+        """追加一批行，histories为这些行已解析的历史数据"""
+        frame = pd.DataFrame(rows, columns=self.df.columns).fillna(np.nan)
+        self.df = frame if len(self.df) == 0 else pd.concat([self.df, frame], ignore_index=True)
+        self.histories = self.histories.concat(histories)
+
+    def take(self, rows):
+        """按rows的顺序取出这些行，返回同类型的新数据集"""
+        dataset = copy.copy(self)
+        dataset.df = self.df.iloc[rows].reset_index(drop=True)
+        dataset.histories = self.histories.take(rows)
+        return dataset
+
+    def __len__(self):
+        return len(self.df)
+
+    def is_stale(self):
+        """文件的修改时间或大小变化后，数据集失效"""
+        try:
+            return file_signature(self.file_path) != self.signature
+        except OSError:
+            return True
+
+    def value(self, row, col):
+        return self.df.iat[row, col]
+
+    def asin(self, row):
+        return self.df.iat[row, self.asin_col]
+
+    def image_url(self, row):
+        return self.df.iat[row, self.image_col]
+
+    def launch_date(self, row):
+        return pd.to_datetime(self.df.iat[row, self.launch_date_col])
+
+    def launch_days(self, rows):
+        """多行的上架日期(datetime64[D])，无法解析的为NaT"""
+        dates = pd.to_datetime(self.df.iloc[rows, self.launch_date_col], errors='coerce')
+        return dates.to_numpy().astype('datetime64[D]')
+
+    def title(self, row):
+        if self.title_col is None:
+            return ''
+        title = self.df.iat[row, self.title_col]
+        return title if isinstance(title, str) else ''
+
+    def history(self, row):
+        """返回某行的(日期, 销量)，没有历史数据时返回None"""
+        if not self.histories.has_history(row):
+            return None
+        return self.histories.dates(row), self.histories.row_sales(row)
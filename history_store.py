@@ -0,0 +1,171 @@
+import json
+from itertools import chain
+
+import numpy as np
+import pandas as pd
+
+import profiling
+
+
+def _parse_fixed_width_days(raw):
+    """按字节解析补零的'YYYY/MM/DD'日期，格式不符时返回None"""
+    try:
+        chars = raw.astype('S10').view(np.uint8).reshape(-1, 10)
+    except UnicodeEncodeError:
+        return None
+    # 较短的字符串会以\0补齐，在数字检查中被排除
+    digits = chars[:, [0, 1, 2, 3, 5, 6, 8, 9]].astype(np.int32) - ord('0')
+    if not (np.all((digits >= 0) & (digits <= 9)) and np.all(chars[:, [4, 7]] == ord('/'))):
+        return None
+    year = digits[:, 0] * 1000 + digits[:, 1] * 100 + digits[:, 2] * 10 + digits[:, 3]
+    month = digits[:, 4] * 10 + digits[:, 5]
+    day = digits[:, 6] * 10 + digits[:, 7]
+    if not np.all((month >= 1) & (month <= 12) & (day >= 1)):
+        return None
+    months = ((year - 1970) * 12 + month - 1).astype('datetime64[M]')
+    dates = months.astype('datetime64[D]') + (day - 1)
+    # 日超出当月天数时（如2月30日）会进位到下个月
+    if not np.all(dates.astype('datetime64[M]') == months):
+        return None
+    return dates.astype(np.int64).astype(np.int32)
+
+
+def parse_days(day_strings):
+    """把'%Y/%m/%d'格式的日期字符串批量转换为距1970-01-01的天数(int32)
+
+    所有字符串都是补零的10位格式时直接按字节计算，否则交给pd.to_datetime。
+    返回(天数, 无法解析的位置)，无法解析的日期天数记为0。
+    """
+    if not day_strings:
+        return np.empty(0, dtype=np.int32), np.zeros(0, dtype=bool)
+    raw = np.array(day_strings)
+    if raw.dtype == np.dtype('U10'):
+        days = _parse_fixed_width_days(raw)
+        if days is not None:
+            return days, np.zeros(len(days), dtype=bool)
+    dates = pd.to_datetime(day_strings, format='%Y/%m/%d', errors='coerce').values.astype('datetime64[D]')
+    invalid = np.isnat(dates)
+    days = np.zeros(len(dates), dtype=np.int32)
+    days[~invalid] = dates[~invalid].astype(np.int64)
+    return days, invalid
+
+
+def _is_sale(value):
+    return value is None or (isinstance(value, (int, float)) and not isinstance(value, bool))
+
+
+class HistoryStore:
+    """所有行的销量历史，按CSR方式存放在连续数组中
+
+    days为距1970-01-01的天数(int32)，sales为销量(float32，None记为0)，
+    第i行的数据为days[offsets[i]:offsets[i + 1]]，valid[i]表示该行是否有历史数据。
+    """
+
+    def __init__(self, days, sales, offsets, valid):
+        self.days = days
+        self.sales = sales
+        self.offsets = offsets
+        self.valid = valid
+
+    @classmethod
+    def empty(cls):
+        return cls(np.empty(0, dtype=np.int32), np.empty(0, dtype=np.float32),
+                   np.zeros(1, dtype=np.int64), np.zeros(0, dtype=bool))
+
+    @classmethod
+    def from_json(cls, json_strings, start_row=0):
+        """一次解析整列junglescout历史数据，start_row为第一个字符串所在的行，用于错误信息"""
+        day_lists = []
+        sales_lists = []
+        valid = np.zeros(len(json_strings), dtype=bool)
+        with profiling.span('history.json', rows=len(json_strings)):
+            for row, json_str in enumerate(json_strings):
+                if not isinstance(json_str, str):
+                    day_lists.append([])
+                    sales_lists.append([])
+                    continue
+                try:
+                    history_data = json.loads(json_str.replace('&#10;', '').strip())
+                    days = history_data['days']
+                    sales = history_data['sales']
+                    if len(days) != len(sales):
+                        raise ValueError('days与sales长度不一致')
+                    if not all(isinstance(day, str) for day in days):
+                        raise ValueError('days中有不是字符串的日期')
+                    if not all(_is_sale(sale) for sale in sales):
+                        raise ValueError('sales中有不是数字的销量')
+                except Exception as e:
+                    print(f"解析第{start_row + row + 1}行历史数据失败: {str(e)}")
+                    day_lists.append([])
+                    sales_lists.append([])
+                    continue
+                day_lists.append(days)
+                sales_lists.append(sales)
+                valid[row] = len(days) > 0
+
+        lengths = np.array([len(days) for days in day_lists], dtype=np.int64)
+        with profiling.span('history.dates'):
+            days, invalid = parse_days(list(chain.from_iterable(day_lists)))
+        # None会被转换为NaN，统一记为0
+        sales = np.array(list(chain.from_iterable(sales_lists)), dtype=np.float32)
+        sales[np.isnan(sales)] = 0
+
+        # 有无法解析的日期的行视为没有历史数据，不影响其他行
+        if invalid.any():
+            point_rows = np.repeat(np.arange(len(json_strings)), lengths)
+            bad_rows = np.unique(point_rows[invalid])
+            for row in bad_rows.tolist():
+                print(f"解析第{start_row + row + 1}行历史数据失败: 日期格式错误")
+            keep = ~np.isin(point_rows, bad_rows)
+            days, sales = days[keep], sales[keep]
+            lengths[bad_rows] = 0
+            valid[bad_rows] = False
+
+        offsets = np.zeros(len(json_strings) + 1, dtype=np.int64)
+        np.cumsum(lengths, out=offsets[1:])
+        return cls(days, sales, offsets, valid)
+
+    def concat(self, other):
+        """返回在末尾追加other各行后的新数据集"""
+        return HistoryStore(
+            np.concatenate([self.days, other.days]),
+            np.concatenate([self.sales, other.sales]),
+            np.concatenate([self.offsets, other.offsets[1:] + self.offsets[-1]]),
+            np.concatenate([self.valid, other.valid]))
+
+    def take(self, rows):
+        """按rows的顺序取出这些行，返回新的数据集"""
+        rows = np.asarray(rows, dtype=np.intp)
+        starts = self.offsets[rows]
+        lengths = self.offsets[rows + 1] - starts
+        offsets = np.zeros(len(rows) + 1, dtype=np.int64)
+        np.cumsum(lengths, out=offsets[1:])
+        positions = np.repeat(starts - offsets[:-1], lengths) + np.arange(offsets[-1])
+        return HistoryStore(self.days[positions], self.sales[positions], offsets, self.valid[rows])
+
+    def __len__(self):
+        return len(self.valid)
+
+    @property
+    def nbytes(self):
+        return self.days.nbytes + self.sales.nbytes + self.offsets.nbytes + self.valid.nbytes
+
+    def has_history(self, row):
+        return bool(self.valid[row])
+
+    def day_offsets(self, row):
+        """某行的天数数组（视图，不复制）"""
+        return self.days[self.offsets[row]:self.offsets[row + 1]]
+
+    def row_sales(self, row):
+        """某行的销量数组（视图，不复制）"""
+        return self.sales[self.offsets[row]:self.offsets[row + 1]]
+
+    def dates(self, row):
+        """某行的日期数组(datetime64[D])，可直接用于绘图"""
+        return self.day_offsets(row).astype('datetime64[D]')
+
+    def date_range(self, row):
+        """某行历史数据的(最早日期, 最晚日期)"""
+        days = self.day_offsets(row)
+        return (np.datetime64(int(days.min()), 'D'), np.datetime64(int(days.max()), 'D'))
@@ -0,0 +1,177 @@
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from PyQt5.QtCore import QObject, QThread, pyqtSignal
+
+import profiling
+
+
+class ImageDownloader(QObject):
+    """后台图片下载管理器
+
+    使用有限的线程池和共享的连接池下载图片，同一URL同时只下载一次，
+    失败时按指数退避重试。重试后仍失败的URL被记录下来，之后的自动预下载会跳过，
+    直到cancel()或用retry_failed=True显式重新下载。
+    cancel()之后，尚未开始或正在重试的任务会被放弃。
+    信号在工作线程中发出，连接到界面对象的槽时会排队到界面线程执行。
+    """
+
+    # 新图片下载完成: url，本地已有的图片不会触发
+    image_ready = pyqtSignal(str)
+    # 当前批次的进度: (已完成, 总数)
+    progress = pyqtSignal(int, int)
+
+    def __init__(self, store, max_workers=8, retries=3, backoff=0.5,
+                 timeout=10, session=None, parent=None):
+        super().__init__(parent)
+        self.store = store
+        self.retries = retries
+        self.backoff = backoff
+        self.timeout = timeout
+        # requests导入较慢，第一次下载时才创建会话
+        self._session = session
+        self._max_workers = max_workers
+        self._session_lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers,
+                                            thread_name_prefix='image-download')
+        self._lock = threading.Lock()
+        self._in_flight = {}
+        # 当前批次中下载失败的URL
+        self._failed = set()
+        self._generation = 0
+        self._done = 0
+        self._total = 0
+
+    @property
+    def session(self):
+        with self._session_lock:
+            if self._session is None:
+                self._session = self._create_session(self._max_workers)
+            return self._session
+
+    @staticmethod
+    def _create_session(max_workers):
+        import requests
+        from requests.adapters import HTTPAdapter
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=max_workers, pool_maxsize=max_workers)
+        session.mount('http://', adapter)
+        session.mount('https://', adapter)
+        return session
+
+    def enqueue(self, urls, retry_failed=False):
+        """把URL加入下载队列，已在下载中的URL会被跳过
+
+        之前下载失败的URL也会被跳过，retry_failed为True时重新下载（如用户点击了单元格）。
+        """
+        with self._lock:
+            generation = self._generation
+            for url in urls:
+                if not isinstance(url, str) or url in self._in_flight:
+                    continue
+                if url in self._failed:
+                    if not retry_failed:
+                        continue
+                    self._failed.discard(url)
+                self._total += 1
+                self._in_flight[url] = self._executor.submit(self._download, url, generation)
+
+    def cancel(self):
+        """放弃所有未完成的下载，例如打开了另一个文件"""
+        with self._lock:
+            self._generation += 1
+            for future in self._in_flight.values():
+                future.cancel()
+            self._in_flight.clear()
+            self._failed.clear()
+            self._done = 0
+            self._total = 0
+
+    def shutdown(self):
+        self.cancel()
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def is_pending(self, url):
+        with self._lock:
+            return url in self._in_flight
+
+    def _download(self, url, generation):
+        present = self.store.contains(url)
+        fetched = not present and self._fetch(url, generation)
+        with self._lock:
+            if generation != self._generation:
+                return
+            self._in_flight.pop(url, None)
+            if not present and not fetched:
+                self._failed.add(url)
+            self._done += 1
+            done, total = self._done, self._total
+            if done == total:
+                self._done = self._total = 0
+        if fetched:
+            self.image_ready.emit(url)
+        self.progress.emit(done, total)
+
+    def _fetch(self, url, generation):
+        """下载单个图片，成功时返回True"""
+        from requests import RequestException
+        for attempt in range(self.retries + 1):
+            if generation != self._generation:
+                return False
+            try:
+                with profiling.span('image.get', attempt=attempt):
+                    response = self.session.get(url, timeout=self.timeout)
+                if response.status_code == 200:
+                    # 在一个事务中写入，界面不会读到不完整的图片
+                    with profiling.span('image.write'):
+                        self.store.put(url, response.content)
+                    return True
+                # 客户端错误（如404）重试也不会成功
+                if response.status_code < 500 and response.status_code != 429:
+                    print(f"下载图片失败: {url} 状态码 {response.status_code}")
+                    return False
+                if attempt == self.retries:
+                    print(f"下载图片失败: {url} 重试{self.retries}次后状态码仍为{response.status_code}")
+                    return False
+            except (RequestException, OSError, sqlite3.Error) as e:
+                if attempt == self.retries:
+                    print(f"下载图片失败: {str(e)}")
+                    return False
+            if attempt < self.retries:
+                time.sleep(self.backoff * 2 ** attempt)
+        return False
+
+
+class ImageMigrator(QThread):
+    """在后台线程中把原来imgs目录中的图片导入ImageStore，只在第一次运行时需要
+
+    调用requestInterruption()后在写完当前批次时停止，下次启动时重新导入。
+    """
+
+    # 进度: (已导入, 总数)
+    progress = pyqtSignal(int, int)
+    # 导入完成: 导入的图片数
+    migrated = pyqtSignal(int)
+    # 导入失败: 错误信息
+    failed = pyqtSignal(str)
+
+    def __init__(self, store, image_dir='imgs', parent=None):
+        super().__init__(parent)
+        self.store = store
+        self.image_dir = image_dir
+
+    def run(self):
+        threading.current_thread().name = 'image-migrator'
+        try:
+            with profiling.span('image.migrate'):
+                imported = self.store.migrate_directory(self.image_dir, progress=self._on_progress)
+            if imported is not None:
+                self.migrated.emit(imported)
+        except Exception as e:
+            self.failed.emit(str(e))
+
+    def _on_progress(self, done, total):
+        self.progress.emit(done, total)
+        return self.isInterruptionRequested()
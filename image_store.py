@@ -0,0 +1,195 @@
+"""下载的图片和缩略图保存在一个SQLite文件中，代替imgs和thumbs目录中的大量小文件
+
+图片按内容的SHA1只保存一份，URL（的MD5）指向图片内容。读取使用mmap，
+总大小超过上限时按最近使用时间删除图片。可以在多个线程中使用，每个线程有自己的连接。
+"""
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+DEFAULT_STORE_PATH = 'images.db'
+DEFAULT_MAX_BYTES = 1024 * 1024 * 1024
+MMAP_SIZE = 256 * 1024 * 1024
+# 超过上限时每次查询的最旧图片数
+EVICT_BATCH = 64
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS blobs (
+    sha1 TEXT PRIMARY KEY,
+    data BLOB NOT NULL
+);
+CREATE TABLE IF NOT EXISTS images (
+    key TEXT PRIMARY KEY,
+    sha1 TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    last_used REAL NOT NULL,
+    thumbnail BLOB
+);
+CREATE INDEX IF NOT EXISTS images_last_used ON images (last_used);
+CREATE INDEX IF NOT EXISTS images_sha1 ON images (sha1);
+CREATE TABLE IF NOT EXISTS meta (
+    name TEXT PRIMARY KEY,
+    value TEXT
+);
+'''
+
+
+def url_key(url):
+    """与原来imgs目录中的文件名相同，迁移时可以直接使用"""
+    return hashlib.md5(url.encode()).hexdigest()
+
+
+class ImageStore:
+    """按URL保存图片内容和缩略图的单文件存储"""
+
+    def __init__(self, path=DEFAULT_STORE_PATH, max_bytes=DEFAULT_MAX_BYTES):
+        self.path = path
+        self.max_bytes = max_bytes
+        self._local = threading.local()
+        self._write_lock = threading.Lock()
+        with self._connection() as db:
+            db.executescript(SCHEMA)
+        # 图片内容的总字节数，写入和删除时更新，不需要每次统计
+        self._total = self.total_bytes()
+
+    def _connection(self):
+        db = getattr(self._local, 'db', None)
+        if db is None:
+            db = sqlite3.connect(self.path, timeout=30)
+            db.execute('PRAGMA journal_mode=WAL')
+            db.execute('PRAGMA synchronous=NORMAL')
+            db.execute(f'PRAGMA mmap_size={MMAP_SIZE}')
+            self._local.db = db
+        return db
+
+    def contains(self, url):
+        row = self._connection().execute(
+            'SELECT 1 FROM images WHERE key = ?', (url_key(url),)).fetchone()
+        return row is not None
+
+    def contains_many(self, urls):
+        """一次查询返回urls中已保存的URL集合"""
+        keys = {}
+        for url in urls:
+            if isinstance(url, str):
+                keys[url_key(url)] = url
+        if not keys:
+            return set()
+        rows = self._connection().execute(
+            'SELECT key FROM images WHERE key IN (SELECT value FROM json_each(?))',
+            (json.dumps(list(keys)),))
+        return {keys[key] for key, in rows}
+
+    def get(self, url):
+        """返回图片内容，没有时返回None"""
+        row = self._connection().execute(
+            'SELECT data FROM images JOIN blobs USING (sha1) WHERE key = ?', (url_key(url),)).fetchone()
+        if row is None:
+            return None
+        self._touch(url_key(url))
+        return row[0]
+
+    def get_thumbnail(self, url):
+        row = self._connection().execute(
+            'SELECT thumbnail FROM images WHERE key = ?', (url_key(url),)).fetchone()
+        if row is None or row[0] is None:
+            return None
+        self._touch(url_key(url))
+        return row[0]
+
+    def put(self, url, data):
+        """保存图片内容，替换该URL原有的图片和缩略图"""
+        self.put_many([(url, data)])
+
+    def put_many(self, items):
+        """在一个事务中保存多个(url, 图片内容)"""
+        self._put_many([(url_key(url), data) for url, data in items])
+        self.evict()
+
+    def put_thumbnail(self, url, data):
+        with self._write_lock, self._connection() as db:
+            db.execute('UPDATE images SET thumbnail = ? WHERE key = ?', (data, url_key(url)))
+
+    def _put_many(self, items):
+        now = time.time()
+        with self._write_lock, self._connection() as db:
+            for key, data in items:
+                sha1 = hashlib.sha1(data).hexdigest()
+                old = db.execute('SELECT sha1 FROM images WHERE key = ?', (key,)).fetchone()
+                if db.execute('INSERT OR IGNORE INTO blobs (sha1, data) VALUES (?, ?)',
+                              (sha1, data)).rowcount:
+                    self._total += len(data)
+                db.execute('INSERT OR REPLACE INTO images (key, sha1, size, last_used) VALUES (?, ?, ?, ?)',
+                           (key, sha1, len(data), now))
+                if old is not None and old[0] != sha1:
+                    self._delete_if_unused(db, old[0])
+
+    def _delete_if_unused(self, db, sha1):
+        """没有URL再指向该内容时删除，内容相同的图片只保存了一份"""
+        row = db.execute('SELECT LENGTH(data) FROM blobs WHERE sha1 = ? AND NOT EXISTS '
+                         '(SELECT 1 FROM images WHERE images.sha1 = blobs.sha1)', (sha1,)).fetchone()
+        if row is not None:
+            db.execute('DELETE FROM blobs WHERE sha1 = ?', (sha1,))
+            self._total -= row[0]
+
+    def _touch(self, key):
+        with self._write_lock, self._connection() as db:
+            db.execute('UPDATE images SET last_used = ? WHERE key = ?', (time.time(), key))
+
+    def total_bytes(self):
+        row = self._connection().execute(
+            'SELECT COALESCE(SUM(LENGTH(data)), 0) FROM blobs').fetchone()
+        return row[0]
+
+    def evict(self):
+        """总大小超过上限时，删除最久未使用的图片"""
+        if self._total <= self.max_bytes:
+            return
+        with self._write_lock, self._connection() as db:
+            # 每次只取最旧的一批，不需要读取整个表
+            while self._total > self.max_bytes:
+                oldest = db.execute('SELECT key, sha1 FROM images ORDER BY last_used LIMIT ?',
+                                    (EVICT_BATCH,)).fetchall()
+                if not oldest:
+                    break
+                for key, sha1 in oldest:
+                    if self._total <= self.max_bytes:
+                        break
+                    db.execute('DELETE FROM images WHERE key = ?', (key,))
+                    self._delete_if_unused(db, sha1)
+
+    def is_migrated(self):
+        """是否已导入过原来imgs目录中的图片"""
+        row = self._connection().execute("SELECT 1 FROM meta WHERE name = 'migrated'").fetchone()
+        return row is not None
+
+    def migrate_directory(self, image_dir='imgs', batch_size=500, progress=None):
+        """把原来imgs目录中的图片（文件名为URL的MD5）导入，只执行一次
+
+        原文件不会被删除，确认导入无误后可以手动删除该目录。
+        progress(已导入数, 总数)在每批写入后调用，返回True时停止，下次启动时重新导入。
+        返回导入的图片数，停止时返回None。
+        """
+        if self.is_migrated():
+            return 0
+        names = []
+        if os.path.isdir(image_dir):
+            for name in sorted(os.listdir(image_dir)):
+                key, ext = os.path.splitext(name)
+                if ext == '.jpg' and len(key) == 32:
+                    names.append(name)
+        for start in range(0, len(names), batch_size):
+            batch = []
+            for name in names[start:start + batch_size]:
+                with open(os.path.join(image_dir, name), 'rb') as f:
+                    batch.append((os.path.splitext(name)[0], f.read()))
+            self._put_many(batch)
+            if progress is not None and progress(start + len(batch), len(names)):
+                return None
+        with self._write_lock, self._connection() as db:
+            db.execute("INSERT OR REPLACE INTO meta (name, value) VALUES ('migrated', ?)", (str(time.time()),))
+        self.evict()
+        return len(names)
@@ -0,0 +1,33 @@
+import numpy as np
+
+
+def visible_slice(x, x0, x1):
+    """返回x（已排序）落在[x0, x1]内的切片，两端各多保留一个点，使曲线延伸到边界"""
+    start = max(int(np.searchsorted(x, x0, side='left')) - 1, 0)
+    stop = min(int(np.searchsorted(x, x1, side='right')) + 1, len(x))
+    return slice(start, stop)
+
+
+def minmax_downsample(x, y, n_buckets):
+    """按点数把序列等分为n_buckets段，每段保留最小值和最大值所在的点
+
+    峰值和谷值都会保留，因此折线的形状与原始数据一致，结果最多2 * n_buckets个点。
+    """
+    n = len(y)
+    if n_buckets <= 0 or n <= 2 * n_buckets:
+        return x, y
+    bucket_size = -(-n // n_buckets)
+    # 用最后一个值补齐到整段，补齐的点不会改变每段的最小值和最大值
+    padded = np.empty(n_buckets * bucket_size, dtype=y.dtype)
+    padded[:n] = y
+    padded[n:] = y[-1]
+    buckets = padded.reshape(n_buckets, bucket_size)
+    starts = np.arange(n_buckets) * bucket_size
+    indices = np.concatenate([
+        starts + buckets.argmin(axis=1),
+        starts + buckets.argmax(axis=1),
+        [0, n - 1],
+    ])
+    indices = np.unique(np.minimum(indices, n - 1))
+    return x[indices], y[indices]
+
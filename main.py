@@ -1,29 +1,73 @@
 import sys
-from PyQt5.QtWidgets import QApplication, QMainWindow, QWidget, QVBoxLayout, QHBoxLayout, QTableWidget, QTableWidgetItem, QMenuBar, QMenu, QAction, QFileDialog, QLabel
-from PyQt5.QtCore import Qt
-import pandas as pd
-import matplotlib.pyplot as plt
-from matplotlib.backends.backend_qt5agg import FigureCanvasQTAgg as FigureCanvas
-from matplotlib.figure import Figure
-from matplotlib.dates import DateFormatter
+from PyQt5.QtWidgets import QApplication, QMainWindow, QWidget, QVBoxLayout, QHBoxLayout, QTableView, QHeaderView, QMenuBar, QMenu, QAction, QFileDialog, QProgressBar, QPushButton, QLabel, QInputDialog, QLineEdit, QComboBox
+from PyQt5.QtCore import Qt, QEvent, QTimer, QItemSelection, QItemSelectionModel, QFileSystemWatcher
+import argparse
 import json
 import os
-from matplotlib.font_manager import FontProperties
-import requests
-from PyQt5.QtGui import QPixmap
-import hashlib
-from matplotlib.backends.backend_qt5agg import NavigationToolbar2QT as NavigationToolbar
+from table_model import DataFrameModel
+from image_downloader import ImageDownloader, ImageMigrator
+from image_store import ImageStore
+from thumbnails import ThumbnailCache, ThumbnailDelegate
+from chart_scheduler import ChartScheduler
+from colors import ColorAssigner
+from aggregate import AggregateCache
+import numpy as np
+import profiling
 
-# 为Mac系统设置中文字体
-if sys.platform.startswith('darwin'):  # Mac系统
-    font = FontProperties(fname='fonts/LXGWWenKai-Regular.ttf')  # Mac系统自带的苹方字体
-else:  # Windows系统
-    font = FontProperties(family='SimHei')
+# pandas、matplotlib、openpyxl导入较慢，在第一次打开文件或显示图表时才导入，使窗口尽快出现
 
-# 设置matplotlib中文字体
-plt.rcParams['font.sans-serif'] = ['PingFang HK', 'Arial Unicode MS']  # Mac常用中文字体
-plt.rcParams['axes.unicode_minus'] = False
-plt.rcParams['font.family'] = 'sans-serif'
+SETTINGS_PATH = os.path.join(os.path.expanduser('~'), '.excel_viewer_settings.json')
+
+def load_settings():
+    """读取用户设置"""
+    try:
+        if os.path.exists(SETTINGS_PATH):
+            with open(SETTINGS_PATH, 'r', encoding='utf-8') as f:
+                return json.load(f)
+    except Exception as e:
+        print(f"加载设置失败: {str(e)}")
+    return {}
+
+def save_settings(settings):
+    """保存用户设置"""
+    try:
+        with open(SETTINGS_PATH, 'w', encoding='utf-8') as f:
+            json.dump(settings, f, ensure_ascii=False)
+    except Exception as e:
+        print(f"保存设置失败: {str(e)}")
+
+_font = None
+
+def get_font(settings=None):
+    """图表使用的中文字体
+
+    第一次查找到的字体文件路径保存在设置中，之后启动时直接使用该文件，不再查找字体。
+    """
+    global _font
+    if _font is not None:
+        return _font
+    from matplotlib.font_manager import FontProperties, findfont
+    if settings is None:
+        settings = load_settings()
+    font_path = settings.get('font_path')
+    if font_path and os.path.exists(font_path):
+        _font = FontProperties(fname=font_path)
+        return _font
+    # 为Mac系统设置中文字体
+    if sys.platform.startswith('darwin'):  # Mac系统
+        _font = FontProperties(fname='fonts/LXGWWenKai-Regular.ttf')  # Mac系统自带的苹方字体
+        font_path = _font.get_file()
+    else:  # Windows系统
+        _font = FontProperties(family='SimHei')
+        try:
+            font_path = findfont(_font, fallback_to_default=False)
+        except ValueError:
+            # 没有找到中文字体时不保存，安装字体后仍能找到
+            return _font
+        _font = FontProperties(fname=font_path)
+    settings['font_path'] = font_path
+    save_settings(settings)
+    return _font
 
 class MainWindow(QMainWindow):
     def __init__(self):
@@ -31,12 +75,36 @@ class MainWindow(QMainWindow):
         self.setWindowTitle("Excel 数据可视化")
         self.setGeometry(100, 100, 1200, 600)
         
-        # 当前打开的文件路径
+        # 当前打开的文件路径及其数据集
         self.current_file = None
+        self.dataset = None
+        
+        # 筛选和排序用的索引（第一次筛选时建立），以及当前的排序列
+        self.search_index = None
+        self.sort_column = None
+        self.sort_descending = False
+        
+        # 正在后台读取的工作簿，以及尚未结束的读取线程
+        self.loader = None
+        self.loaders = set()
+        
+        # 文件被重新写入后在后台重新读取的线程，读取期间文件再次变化时读完后再读一次
+        self.reloader = None
+        self.reload_pending = False
         
         # 加载用户设置
         self.settings = self.load_settings()
         
+        # 工作簿解析结果的缓存，第一次打开文件时创建
+        self._workbook_cache = None
+        
+        # 图表在第一次使用时创建
+        self._chart = None
+        
+        # 窗口第一次绘制之后才执行的操作（创建图表、打开上次的文件等）
+        self._painted = False
+        self._after_first_paint = []
+        
         # 创建菜单栏
         self.create_menu_bar()
         
@@ -51,13 +119,63 @@ class MainWindow(QMainWindow):
         self.init_colors()
         
         # 根据设置决定是否自动加载上次的文件，如果不加载则显示空白界面
+        # 都在窗口显示之后进行，不推迟窗口出现的时间
         if self.settings.get('auto_load_last_file', False) and self.recent_files:
             last_file = self.recent_files[0]
             if os.path.exists(last_file):
-                self.load_excel_file(last_file)
+                self.run_after_first_paint(lambda: self.load_excel_file(last_file))
         else:
             self.load_data()  # 显示空白界面
     
+    def run_after_first_paint(self, func):
+        """窗口第一次绘制之后再执行func，不推迟窗口出现的时间
+
+        零延时的定时器会在窗口第一次绘制之前触发，所以等到第一个Paint事件后才安排执行。
+        """
+        if self._painted:
+            QTimer.singleShot(0, func)
+        else:
+            self._after_first_paint.append(func)
+    
+    def event(self, event):
+        if event.type() == QEvent.Paint and not self._painted:
+            self._painted = True
+            for func in self._after_first_paint:
+                QTimer.singleShot(0, func)
+            self._after_first_paint.clear()
+        return super().event(event)
+    
+    @property
+    def workbook_cache(self):
+        """工作簿解析结果的缓存，再次打开同一文件时跳过xlsx解析"""
+        if self._workbook_cache is None:
+            from workbook_cache import WorkbookCache
+            self._workbook_cache = WorkbookCache(
+                max_bytes=self.settings.get('cache_max_mb', 512) * 1024 * 1024)
+        return self._workbook_cache
+    
+    @property
+    def chart(self):
+        """销量趋势图，第一次使用时创建"""
+        if self._chart is None:
+            self.create_chart()
+        return self._chart
+    
+    def create_chart(self):
+        """创建图表和工具栏，放在右侧布局中"""
+        if self._chart is not None:
+            return
+        with profiling.span('chart.create'):
+            from chart_canvas import create_chart_canvas
+            from chart import SalesChart
+            self.figure, self.canvas, self.toolbar = create_chart_canvas(self.chart_widget)
+            # 销量趋势图，选中行变化时增量更新
+            self._chart = SalesChart(self.figure, self.canvas, get_font(self.settings),
+                                     raw=self.settings.get('show_raw_data', False))
+            # 将工具栏和画布添加到右侧布局
+            self.chart_widget.layout().addWidget(self.toolbar)
+            self.chart_widget.layout().addWidget(self.canvas)
+    
     def setup_ui(self):
         """设置UI组件"""
         main_widget = QWidget()
@@ -66,73 +184,131 @@ class MainWindow(QMainWindow):
         # 创建主布局
         layout = QHBoxLayout(main_widget)
         
-        # 左侧表格
-        self.table = QTableWidget()
-        layout.addWidget(self.table)
+        # 下载的图片和缩略图保存在一个SQLite文件中，第一次运行时在窗口显示后导入原来imgs目录中的图片
+        self.image_store = ImageStore(
+            max_bytes=self.settings.get('image_cache_mb', 1024) * 1024 * 1024)
+        self.image_migrator = None
+        if not self.image_store.is_migrated():
+            self.run_after_first_paint(self.start_image_migration)
+        
+        # 左侧表格，单元格内容由模型按需提供
+        self.table = QTableView()
+        self.table_model = DataFrameModel()
+        self.table.setModel(self.table_model)
+        
+        # 表格上方的筛选栏
+        left_widget = QWidget()
+        left_layout = QVBoxLayout(left_widget)
+        left_layout.setContentsMargins(0, 0, 0, 0)
+        left_layout.addLayout(self.create_filter_bar())
+        left_layout.addWidget(self.table)
+        layout.addWidget(left_widget)
+        
+        # 图片列只为可见行绘制缩略图
+        self.thumbnails = ThumbnailCache(
+            self.image_store,
+            max_bytes=self.settings.get('thumbnail_cache_mb', 64) * 1024 * 1024)
+        self.thumbnail_delegate = ThumbnailDelegate(self.thumbnails, self.table)
         
         # 启用多选功能和行为设置
-        self.table.setSelectionMode(QTableWidget.MultiSelection)
-        self.table.setSelectionBehavior(QTableWidget.SelectRows)
-        self.table.itemSelectionChanged.connect(self.on_selection_change)
+        self.table.setSelectionMode(QTableView.MultiSelection)
+        self.table.setSelectionBehavior(QTableView.SelectRows)
+        # 选中变化后在后台线程中准备绘图数据，只绘制最新的结果
+        self.chart_scheduler = ChartScheduler(self.chart_request, self.prepare_chart, parent=self)
+        self.chart_scheduler.result_ready.connect(self.apply_chart)
+        self.table.selectionModel().selectionChanged.connect(lambda *args: self.on_selection_change())
         
         # 添加表头点击事件
         self.table.horizontalHeader().sectionClicked.connect(self.on_header_clicked)
         
-        # 右侧布局（包含图表和工具栏）
-        right_widget = QWidget()
-        right_layout = QVBoxLayout(right_widget)
-        
-        # 创建图表
-        self.figure = Figure(figsize=(6, 4))
-        self.canvas = FigureCanvas(self.figure)
+        # 添加表格项目点击事件（仅用于处理未下载的图片）
+        self.table.clicked.connect(self.on_item_clicked)
         
-        # 添加工具栏
-        self.toolbar = NavigationToolbar(self.canvas, right_widget)
+        # 后台下载图片，滚动时预下载可见行的图片
+        self.image_downloader = ImageDownloader(self.image_store)
+        self.image_downloader.image_ready.connect(self.on_image_downloaded)
+        self.image_downloader.progress.connect(self.on_download_progress)
+        self.table.verticalScrollBar().valueChanged.connect(self.prefetch_visible_images)
         
-        # 将工具栏和画布添加到右侧布局
-        right_layout.addWidget(self.toolbar)
-        right_layout.addWidget(self.canvas)
+        # 右侧布局（包含图表和工具栏），图表由create_chart()创建
+        self.chart_widget = QWidget()
+        QVBoxLayout(self.chart_widget)
         
         # 将右侧部件添加到主布局
-        layout.addWidget(right_widget)
+        layout.addWidget(self.chart_widget)
         
         # 设置布局比例
         layout.setStretch(0, 1)
         layout.setStretch(1, 1)
         
-        # 创建imgs文件夹（如果不存在）
-        if not os.path.exists('imgs'):
-            os.makedirs('imgs')
-        
-        # 设置表格的行高
+        # 设置表格的行高，固定行高避免逐行计算尺寸
+        self.table.verticalHeader().setSectionResizeMode(QHeaderView.Fixed)
         self.table.verticalHeader().setDefaultSectionSize(100)
+        
+        # 状态栏中的读取进度和取消按钮，只在后台读取时显示
+        self.load_progress = QProgressBar()
+        self.load_progress.setMaximumWidth(200)
+        self.cancel_load_button = QPushButton('取消')
+        self.cancel_load_button.clicked.connect(self.cancel_loading)
+        self.statusBar().addPermanentWidget(self.load_progress)
+        self.statusBar().addPermanentWidget(self.cancel_load_button)
+        self.load_progress.hide()
+        self.cancel_load_button.hide()
+        
+        # 状态栏中各阶段的耗时，启用性能分析时定时刷新
+        self.profile_label = QLabel()
+        self.statusBar().addPermanentWidget(self.profile_label)
+        self.profile_timer = QTimer(self)
+        self.profile_timer.setInterval(500)
+        self.profile_timer.timeout.connect(self.update_profile_label)
+        self.trace_path = profiling.env_trace_path() or profiling.DEFAULT_TRACE_PATH
+        self.set_profiling(self.settings.get('profiling', False) or profiling.env_trace_path() is not None)
+        
+        # 监视当前文件，写入通常分多次完成，停止变化一段时间后才重新读取
+        self.file_watcher = QFileSystemWatcher(self)
+        self.file_watcher.fileChanged.connect(self.on_file_changed)
+        self.file_watcher.directoryChanged.connect(self.on_file_changed)
+        self.reload_timer = QTimer(self)
+        self.reload_timer.setSingleShot(True)
+        self.reload_timer.setInterval(1000)
+        self.reload_timer.timeout.connect(self.reload_current_file)
+    
+    def create_filter_bar(self):
+        """搜索框（ASIN或标题）和按列的范围筛选，输入停止后才执行筛选"""
+        filter_layout = QHBoxLayout()
+        self.search_edit = QLineEdit()
+        self.search_edit.setPlaceholderText('搜索ASIN或标题')
+        self.range_combo = QComboBox()
+        self.range_min = QLineEdit()
+        self.range_min.setPlaceholderText('最小值')
+        self.range_max = QLineEdit()
+        self.range_max.setPlaceholderText('最大值')
+        clear_button = QPushButton('清除')
+        clear_button.clicked.connect(self.clear_filter)
+        for widget in (self.search_edit, self.range_combo, self.range_min, self.range_max):
+            filter_layout.addWidget(widget)
+        filter_layout.addWidget(clear_button)
+        filter_layout.setStretch(0, 3)
+        
+        self.filter_timer = QTimer(self)
+        self.filter_timer.setSingleShot(True)
+        self.filter_timer.setInterval(200)
+        self.filter_timer.timeout.connect(self.apply_filter)
+        self.search_edit.textChanged.connect(lambda text: self.filter_timer.start())
+        self.range_min.textChanged.connect(lambda text: self.filter_timer.start())
+        self.range_max.textChanged.connect(lambda text: self.filter_timer.start())
+        self.range_combo.currentIndexChanged.connect(lambda i: self.filter_timer.start())
+        
+        self.filter_widgets = [self.search_edit, self.range_combo, self.range_min,
+                               self.range_max, clear_button]
+        self.reset_filter()
+        return filter_layout
     
     def init_colors(self):
         """初始化颜色设置"""
-        self.colors = [
-            '#1f77b4',  # 蓝色
-            '#ff7f0e',  # 橙色
-            '#2ca02c',  # 绿色
-            '#d62728',  # 红色
-            '#9467bd',  # 紫色
-            '#8c564b',  # 棕色
-            '#e377c2',  # 粉色
-            '#7f7f7f',  # 灰色
-            '#bcbd22',  # 黄绿色
-            '#17becf',  # 青色
-            '#ff9896',  # 浅红色
-            '#98df8a',  # 浅绿色
-            '#c5b0d5',  # 浅紫色
-            '#c49c94',  # 浅棕色
-            '#f7b6d2',  # 浅粉色
-            '#dbdb8d',  # 浅黄色
-            '#9edae5',  # 浅青色
-            '#ad494a',  # 深红色
-            '#8c6d31',  # 深黄色
-            '#bd9e39'   # 金色
-        ]
-        self.asin_colors = {}
-        self.used_color_indices = set()
+        self.colors = ColorAssigner()
+        # 选中很多产品时的汇总结果
+        self.aggregates = AggregateCache()
     
     def create_menu_bar(self):
         menubar = self.menuBar()
@@ -146,6 +322,12 @@ class MainWindow(QMainWindow):
         open_action.triggered.connect(self.open_file)
         file_menu.addAction(open_action)
         
+        # 打开文件夹（工作区）动作
+        open_folder_action = QAction('打开文件夹', self)
+        open_folder_action.setShortcut('Ctrl+Shift+O')
+        open_folder_action.triggered.connect(self.open_folder)
+        file_menu.addAction(open_folder_action)
+        
         # 最近打开的文件子菜单
         self.recent_menu = file_menu.addMenu('最近打开')
         
@@ -165,6 +347,32 @@ class MainWindow(QMainWindow):
         self.start_time_action.setChecked(self.settings.get('start_from_launch_date', True))
         self.start_time_action.triggered.connect(self.toggle_start_time)
         settings_menu.addAction(self.start_time_action)
+        
+        # 打开文件后预下载全部图片（否则只下载可见行的图片）
+        self.prefetch_all_action = QAction('预下载全部图片', self)
+        self.prefetch_all_action.setCheckable(True)
+        self.prefetch_all_action.setChecked(self.settings.get('prefetch_all_images', False))
+        self.prefetch_all_action.triggered.connect(self.toggle_prefetch_all)
+        settings_menu.addAction(self.prefetch_all_action)
+        
+        # 显示原始数据（不降采样）
+        self.raw_data_action = QAction('显示原始数据', self)
+        self.raw_data_action.setCheckable(True)
+        self.raw_data_action.setChecked(self.settings.get('show_raw_data', False))
+        self.raw_data_action.triggered.connect(self.toggle_raw_data)
+        settings_menu.addAction(self.raw_data_action)
+        
+        # 选中行数超过阈值时显示汇总而不是每个产品一条曲线
+        aggregate_action = QAction('汇总显示阈值...', self)
+        aggregate_action.triggered.connect(self.set_aggregate_threshold)
+        settings_menu.addAction(aggregate_action)
+        
+        # 记录各阶段耗时，关闭时导出trace文件
+        self.profiling_action = QAction('性能分析', self)
+        self.profiling_action.setCheckable(True)
+        self.profiling_action.setChecked(self.settings.get('profiling', False))
+        self.profiling_action.triggered.connect(self.toggle_profiling)
+        settings_menu.addAction(self.profiling_action)
     
     def load_recent_files(self):
         try:
@@ -210,6 +418,11 @@ class MainWindow(QMainWindow):
         if file_path:
             self.load_excel_file(file_path)
     
+    def open_folder(self):
+        folder = QFileDialog.getExistingDirectory(self, "选择包含Excel文件的文件夹")
+        if folder:
+            self.load_excel_file(folder)
+    
     def open_recent_file(self, file_path):
         if os.path.exists(file_path):
             self.load_excel_file(file_path)
@@ -221,166 +434,422 @@ class MainWindow(QMainWindow):
     
     def load_excel_file(self, file_path):
         try:
-            self.current_file = file_path
-            df = pd.read_excel(file_path)
-            
-            # 设置表格
-            self.table.setRowCount(len(df))
-            self.table.setColumnCount(len(df.columns))
-            self.table.setHorizontalHeaderLabels(df.columns)
-            
-            # 获取图片链接列的索引
-            image_col_index = df.columns.get_loc("图片链接")
-            
-            # 填充表格数据
-            for i in range(len(df)):
-                for j in range(len(df.columns)):
-                    item = QTableWidgetItem(str(df.iloc[i, j]))
-                    self.table.setItem(i, j, item)
-                    
-                    # 如果是图片链接列，检查是否已有缓存图片
-                    if j == image_col_index:
-                        image_url = df.iloc[i, j]
-                        # 使用URL的MD5作为文件名
-                        filename = hashlib.md5(image_url.encode()).hexdigest() + '.jpg'
-                        local_path = os.path.join('imgs', filename)
-                        
-                        # 如果图片已存在，直接显示
-                        if os.path.exists(local_path):
-                            image_label = self.create_image_label(local_path)
-                            self.table.setCellWidget(i, j, image_label)
-            
-            # 添加表格项目点击事件（仅用于处理未下载的图片）
-            self.table.itemClicked.connect(self.on_item_clicked)
+            # 切换文件时停止正在进行的后台读取
+            self.cancel_loading()
+            if os.path.isdir(file_path):
+                self.load_workspace(file_path)
+                return
             
-            # 清空图表
-            ax = self.figure.gca()
-            ax.clear()
-            ax.set_xlabel('时间', fontproperties=font)
-            ax.set_ylabel('销量', fontproperties=font)
-            ax.set_title('点击表格行显示销量趋势', fontproperties=font)
-            self.canvas.draw()
+            # 同一文件未修改时复用已解析的数据集，其次使用缓存
+            dataset = self.dataset
+            if (dataset is None or dataset.file_path != file_path
+                    or not dataset.complete or dataset.is_stale()):
+                from dataset import ExcelDataset
+                with profiling.span('cache.load'):
+                    cached = self.workbook_cache.load(file_path)
+                dataset = ExcelDataset(file_path, *cached) if cached is not None else None
+            if dataset is not None:
+                self.show_dataset(dataset)
+                self.add_recent_file(file_path)
+                return
             
-            # 添加到最近打开文件历史
-            self.add_recent_file(file_path)
+            # 没有缓存时在后台分批读取，表格随读取进度逐步填充
+            from workbook_loader import WorkbookLoader
+            self.current_file = file_path
+            loader = WorkbookLoader(file_path)
+            loader.header_ready.connect(lambda header: self.on_loader_header(loader, header))
+            loader.batch_ready.connect(lambda rows, histories: self.on_loader_batch(loader, rows, histories))
+            loader.progress.connect(lambda done, total: self.on_loader_progress(loader, done, total))
+            loader.loaded.connect(lambda: self.on_loader_finished(loader))
+            loader.failed.connect(lambda message: self.on_loader_failed(loader, message))
+            self.start_loader(loader)
             
         except Exception as e:
             print(f"加载文件时出错: {str(e)}")
             import traceback
             traceback.print_exc()
     
-    def get_next_color(self):
-        """获取下一个未使用的颜色"""
-        # 如果所有颜色都用完了，重置使用记录
-        if len(self.used_color_indices) >= len(self.colors):
-            self.used_color_indices.clear()
-            
-        # 找到第一个未使用的颜色
-        for i in range(len(self.colors)):
-            if i not in self.used_color_indices:
-                self.used_color_indices.add(i)
-                return self.colors[i]
-                
-        # 如果没有找到（理论上不会发生），返回第一个颜色
-        return self.colors[0]
+    def load_workspace(self, folder):
+        """在后台读取并合并文件夹中的全部工作簿，只解析新增或修改过的文件"""
+        dataset = self.dataset
+        if dataset is not None and dataset.file_path == folder and not dataset.is_stale():
+            self.show_dataset(dataset)
+            self.add_recent_file(folder)
+            return
+        from workbook_loader import WorkspaceLoader
+        self.current_file = folder
+        loader = WorkspaceLoader(folder, self.workbook_cache)
+        loader.progress.connect(lambda done, total: self.on_workspace_progress(loader, done, total))
+        loader.loaded.connect(lambda dataset: self.on_workspace_loaded(loader, dataset))
+        loader.failed.connect(lambda message: self.on_loader_failed(loader, message))
+        self.start_loader(loader)
     
-    def on_selection_change(self):
-        if not self.current_file:
+    def start_loader(self, loader):
+        loader.finished.connect(lambda: self.loaders.discard(loader))
+        self.loaders.add(loader)
+        self.loader = loader
+        self.load_progress.setRange(0, 0)
+        self.load_progress.show()
+        self.cancel_load_button.show()
+        self.statusBar().showMessage(f"正在读取 {os.path.basename(loader.file_path)}")
+        loader.start()
+    
+    def on_workspace_progress(self, loader, done, total):
+        if loader is not self.loader:
+            return
+        self.load_progress.setRange(0, total)
+        self.load_progress.setValue(done)
+        self.statusBar().showMessage(f"正在读取 {done}/{total} 个文件")
+    
+    def on_workspace_loaded(self, loader, dataset):
+        if loader is not self.loader:
+            return
+        self.loader = None
+        self.load_progress.hide()
+        self.cancel_load_button.hide()
+        self.show_dataset(dataset)
+        self.statusBar().showMessage(f"读取完成，{len(dataset.files)}个文件共{len(dataset)}个产品", 3000)
+        self.add_recent_file(dataset.file_path)
+    
+    def show_dataset(self, dataset):
+        """在表格中显示数据集，并清空图表"""
+        self.dataset = dataset
+        self.current_file = dataset.file_path
+        
+        # 设置表格，单元格和已缓存的图片在滚动到可见区域时才生成
+        self.table.clearSelection()
+        if self.table_model.dataset is not None:
+            self.table.setItemDelegateForColumn(self.table_model.dataset.image_col, None)
+        with profiling.span('table.reset', rows=len(dataset)):
+            self.table_model.set_dataset(dataset)
+        self.table.setItemDelegateForColumn(dataset.image_col, self.thumbnail_delegate)
+        self.reset_filter()
+        self.watch_file(dataset.file_path)
+        
+        # 放弃上一个文件未完成的下载，开始预下载当前文件的图片
+        self.image_downloader.cancel()
+        self.prefetch_images()
+        
+        # 清空图表
+        self.chart.clear()
+    
+    def cancel_loading(self):
+        """停止后台读取，已读取的行仍保留在表格中"""
+        loader = self.loader
+        if loader is None:
+            return
+        self.loader = None
+        loader.requestInterruption()
+        self.load_progress.hide()
+        self.cancel_load_button.hide()
+        self.reset_filter()
+        if self.dataset is not None and self.dataset.file_path == loader.file_path:
+            self.statusBar().showMessage(f"已取消读取，显示前{len(self.dataset)}行", 3000)
+    
+    def on_loader_header(self, loader, header):
+        if loader is not self.loader:
+            return
+        try:
+            from dataset import ExcelDataset
+            self.show_dataset(ExcelDataset.streaming(loader.file_path, header))
+        except Exception as e:
+            print(f"加载文件时出错: {str(e)}")
+            self.cancel_loading()
+    
+    def on_loader_batch(self, loader, rows, histories):
+        """追加一批行，已到达的行可以立即选中和绘图"""
+        if loader is not self.loader or self.dataset is None:
+            return
+        with profiling.span('table.append', rows=len(rows)):
+            self.dataset.append_rows(rows, histories)
+            self.table_model.rows_appended()
+        if self.settings.get('prefetch_all_images', False):
+            self.download_missing_images(row[self.dataset.image_col] for row in rows)
+        else:
+            self.prefetch_visible_images()
+    
+    def on_loader_progress(self, loader, done, total):
+        if loader is not self.loader:
             return
+        self.load_progress.setRange(0, total)
+        self.load_progress.setValue(done)
+        self.statusBar().showMessage(f"正在读取 {done}/{total} 行")
+    
+    def on_loader_finished(self, loader):
+        """读取完成后写入缓存，下次打开时直接读取缓存"""
+        if loader is not self.loader:
+            return
+        self.loader = None
+        self.load_progress.hide()
+        self.cancel_load_button.hide()
+        dataset = self.dataset
+        dataset.complete = True
+        self.reset_filter()
+        self.statusBar().showMessage(f"读取完成，共{len(dataset)}行", 3000)
+        self.add_recent_file(dataset.file_path)
+        try:
+            with profiling.span('cache.store'):
+                self.workbook_cache.store(dataset.file_path, dataset.df, dataset.histories)
+        except Exception as e:
+            print(f"写入缓存失败: {str(e)}")
+    
+    def reset_filter(self):
+        """数据集变化后清空筛选条件和排序，读取完成前不能筛选"""
+        self.search_index = None
+        self.sort_column = None
+        self.sort_descending = False
+        self.table.horizontalHeader().setSortIndicatorShown(False)
+        for widget in (self.search_edit, self.range_min, self.range_max):
+            widget.blockSignals(True)
+            widget.clear()
+            widget.blockSignals(False)
+        self.range_combo.blockSignals(True)
+        self.range_combo.clear()
+        self.range_combo.addItem('按列筛选', None)
+        self.range_combo.blockSignals(False)
+        enabled = self.dataset is not None and self.loader is None
+        for widget in self.filter_widgets:
+            widget.setEnabled(enabled)
+        if enabled:
+            self.range_combo.blockSignals(True)
+            for col in self.get_search_index().range_columns():
+                self.range_combo.addItem(str(self.dataset.df.columns[col]).strip(), col)
+            self.range_combo.blockSignals(False)
+    
+    def get_search_index(self):
+        if self.search_index is None or self.search_index.dataset is not self.dataset:
+            from search_index import SearchIndex
+            self.search_index = SearchIndex(self.dataset)
+        return self.search_index
+    
+    def clear_filter(self):
+        """清除筛选条件和排序，显示全部行"""
+        self.reset_filter()
+        self.set_view_order(None)
+    
+    def apply_filter(self):
+        """按搜索框、范围和排序列计算显示的行"""
+        if self.dataset is None or self.loader is not None:
+            return
+        try:
+            index = self.get_search_index()
+            matches = []
+            text = self.search_edit.text().strip()
+            if text:
+                matches.append(index.text_rows(text))
+            col = self.range_combo.currentData()
+            if col is not None:
+                low = index.parse_bound(col, self.range_min.text())
+                high = index.parse_bound(col, self.range_max.text())
+                if low is not None or high is not None:
+                    matches.append(index.range_rows(col, low, high))
             
+            with profiling.span('filter.apply'):
+                mask = None
+                if matches:
+                    mask = np.zeros(len(self.dataset), dtype=bool)
+                    mask[matches[0]] = True
+                    for rows in matches[1:]:
+                        keep = np.zeros(len(self.dataset), dtype=bool)
+                        keep[rows] = True
+                        mask &= keep
+                if self.sort_column is not None:
+                    order = index.sort_order(self.sort_column, self.sort_descending)
+                    if mask is not None:
+                        order = order[mask[order]]
+                else:
+                    order = np.flatnonzero(mask) if mask is not None else None
+            self.set_view_order(order)
+            if mask is not None:
+                self.statusBar().showMessage(f"筛选出{len(order)}行，共{len(self.dataset)}行", 3000)
+        except ValueError as e:
+            self.statusBar().showMessage(str(e), 3000)
+        except Exception as e:
+            print(f"筛选时出错: {str(e)}")
+            import traceback
+            traceback.print_exc()
+    
+    def set_view_order(self, order):
+        """改变显示的行，仍然可见的选中行保持选中"""
+        selected = self.selected_rows()
+        selection_model = self.table.selectionModel()
+        with profiling.span('filter.view', rows=len(order) if order is not None else -1):
+            self.table_model.set_row_order(order)
+            # 选中行的图表最后统一更新一次
+            selection_model.blockSignals(True)
+            self.select_source_rows(selected)
+            selection_model.blockSignals(False)
+        # 有选中行被筛选掉时才需要更新图表
+        if self.selected_rows() != selected:
+            self.on_selection_change()
+        self.prefetch_visible_images()
+    
+    def select_source_rows(self, rows):
+        """选中数据集中的这些行，连续的行合并为一个选择范围"""
+        model = self.table_model
+        view_rows = sorted(v for v in (model.view_row(row) for row in rows) if v >= 0)
+        selection = QItemSelection()
+        last_col = model.columnCount() - 1
+        start = prev = None
+        for row in view_rows + [None]:
+            if start is not None and row != prev + 1:
+                selection.select(model.index(start, 0), model.index(prev, last_col))
+                start = None
+            if start is None:
+                start = row
+            prev = row
+        self.table.selectionModel().select(selection, QItemSelectionModel.Select | QItemSelectionModel.Rows)
+    
+    def on_loader_failed(self, loader, message):
+        if loader is not self.loader:
+            return
+        print(f"加载文件时出错: {message}")
+        self.cancel_loading()
+        self.statusBar().showMessage(f"读取文件失败: {message}", 5000)
+    
+    def current_dataset(self):
+        """返回当前数据集，文件被修改后在后台重新读取，读完前仍使用旧数据"""
+        if self.dataset is not None and self.dataset.complete and self.dataset.is_stale():
+            self.reload_timer.start()
+        return self.dataset
+    
+    def watch_file(self, path):
+        """只监视当前打开的文件及其所在的文件夹，工作区监视文件夹和其中的工作簿"""
+        watched = self.file_watcher.files() + self.file_watcher.directories()
+        if watched:
+            self.file_watcher.removePaths(watched)
+        if os.path.isdir(path):
+            from workspace import scan_folder
+            paths = [path] + [os.path.join(path, name) for name in scan_folder(path)]
+        else:
+            # 保存时先写临时文件再改名的程序会使文件本身的监视失效，文件夹的变化仍能收到
+            paths = [path, os.path.dirname(os.path.abspath(path))]
+        self.file_watcher.addPaths([p for p in paths if os.path.exists(p)])
+    
+    def on_file_changed(self, path):
+        self.reload_timer.start()
+    
+    def reload_current_file(self):
+        """文件变化后在后台重新读取，读完后由on_reloaded()只更新变化的行"""
+        dataset = self.dataset
+        if dataset is None or not dataset.complete or self.loader is not None:
+            return
+        if self.reloader is not None:
+            self.reload_pending = True
+            return
+        if not dataset.is_stale():
+            return
+        from workbook_loader import WorkbookReloader
+        reloader = WorkbookReloader(dataset, self.workbook_cache)
+        reloader.reloaded.connect(self.on_reloaded)
+        reloader.failed.connect(lambda message: print(f"重新读取文件失败: {message}"))
+        reloader.finished.connect(lambda: self.on_reloader_finished(reloader))
+        self.loaders.add(reloader)
+        self.reloader = reloader
+        reloader.start()
+    
+    def on_reloader_finished(self, reloader):
+        self.loaders.discard(reloader)
+        if reloader is not self.reloader:
+            return
+        self.reloader = None
+        if self.dataset is not None:
+            self.watch_file(self.dataset.file_path)
+        if self.reload_pending:
+            self.reload_pending = False
+            self.reload_timer.start()
+    
+    def on_reloaded(self, old, new, diff):
+        """只删除、重绘和追加变化的行，保留选中状态、颜色和已加载的图片"""
+        if old is not self.dataset or self.loader is not None:
+            return
         try:
-            # 获取所有选中的行
-            selected_rows = set(item.row() for item in self.table.selectedItems())
-            if not selected_rows:
-                # 如果没有选中行，清空图表
-                self.clear_plot()
+            if diff is None:
+                # 列发生变化时只能整表重新显示
+                self.show_dataset(new)
                 return
+            dataset = diff['dataset']
+            changed = diff['changed']
+            selection_model = self.table.selectionModel()
+            with profiling.span('reload.patch', changed=len(changed), added=diff['added'],
+                                removed=diff['removed']):
+                selection_model.blockSignals(True)
+                self.table_model.patch_dataset(dataset, diff['old_to_new'], changed)
+                selection_model.blockSignals(False)
+            self.dataset = dataset
             
-            # 获取数据
-            df = pd.read_excel(self.current_file)
-            
-            # 准备绘图
-            ax = self.figure.gca()
-            ax.clear()  # 清除旧图表
-            
-            # 用于存储所有日期范围
-            launch_dates = []
-            first_data_dates = []
-            max_dates = []
-            
-            # 预处理所有选中行的数据
-            plot_data = []
-            
-            # 收集数据
-            for row in selected_rows:
-                row_data = df.iloc[row]
-                asin = row_data["ASIN"]
-                
-                # 分配颜色
-                if asin not in self.asin_colors:
-                    self.asin_colors[asin] = self.get_next_color()
-                
-                # 解析JSON数据
-                json_str = row_data['历史数据-junglescout'].replace('&#10;', '').strip()
-                history_data = json.loads(json_str)
-                
-                # 处理日期和销量数据
-                dates = pd.to_datetime(history_data['days'], format='%Y/%m/%d')
-                sales = [0 if x is None else x for x in history_data['sales']]
-                
-                # 记录日期范围
-                launch_date = pd.to_datetime(row_data['上架日期'])
-                launch_dates.append(launch_date)
-                first_data_dates.append(dates.min())
-                max_dates.append(dates.max())
-                
-                # 存储绘图数据
-                plot_data.append({
-                    'asin': asin,
-                    'title': row_data.get('标题', '')[:30] + '...',  # 添加标题前30个字符
-                    'dates': dates,
-                    'sales': sales,
-                    'color': self.asin_colors[asin]
-                })
-            
-            # 绘制所有数据
-            for data in plot_data:
-                ax.plot(data['dates'], data['sales'], '-o', 
-                       label=f"{data['asin']}\n{data['title']}", 
-                       color=data['color'],
-                       linewidth=2,
-                       markersize=4)
-            
-            # 设置图表范围和样式
-            ax.set_ylim(bottom=0)
-            
-            if launch_dates:
-                # 设置x轴范围
-                start_date = min(launch_dates if self.settings.get('start_from_launch_date', True) 
-                               else first_data_dates)
-                ax.set_xlim(start_date, max(max_dates))
-                
-                # 设置图表属性
-                ax.set_xlabel('时间', fontproperties=font)
-                ax.set_ylabel('销量', fontproperties=font)
-                ax.set_title('多产品销量趋势对比', fontproperties=font)
-                
-                # 设置图例
-                # ax.legend(prop=font, bbox_to_anchor=(1.05, 1), 
-                #          loc='upper left', borderaxespad=0.)
-                ax.legend(prop=font)
-                
-                # 设置x轴时间格式
-                ax.xaxis.set_major_formatter(DateFormatter('%Y/%m/%d'))
-                ax.xaxis.set_tick_params(labelrotation=-45)
-                
-                # 添加网格
-                ax.grid(True, linestyle='--', alpha=0.7)
-            
-            # 自动调整布局
-            self.figure.tight_layout()
-            self.canvas.draw()
+            # 只重新绘制内容变化的曲线，其余曲线保持不变
+            self.chart.invalidate({dataset.asin(row) for row in changed.tolist()})
+            # 筛选或排序时按新数据重新计算显示的行
+            if self.table_model.is_filtered():
+                self.apply_filter()
+            self.on_selection_change()
             
+            if diff['added'] and self.settings.get('prefetch_all_images', False):
+                self.download_missing_images(dataset.df.iloc[len(dataset) - diff['added']:, dataset.image_col])
+            self.prefetch_visible_images()
+            self.statusBar().showMessage(
+                f"文件已更新: {len(changed)}行变化，新增{diff['added']}行，删除{diff['removed']}行", 5000)
+        except Exception as e:
+            print(f"更新表格时出错: {str(e)}")
+            import traceback
+            traceback.print_exc()
+    
+    def on_selection_change(self):
+        """安排更新图表，连续的选中变化只在停止变化后更新一次"""
+        self.chart_scheduler.schedule()
+    
+    def chart_request(self):
+        """在界面线程中读取绘图需要的状态，交给后台线程的prepare_chart()"""
+        if not self.current_file:
+            return None
+        return {
+            'dataset': self.current_dataset(),
+            'rows': self.selected_rows(),
+            'start_from_launch_date': self.settings.get('start_from_launch_date', True),
+            'aggregate_threshold': self.settings.get('aggregate_threshold', 50),
+        }
+    
+    def prepare_chart(self, request, cancelled):
+        """在后台线程中准备绘图数据，cancelled()为真时选中状态已经变化，可以放弃"""
+        if request is None:
+            return None
+        selected_rows = request['rows']
+        if not selected_rows:
+            return {'mode': 'clear'}
+        dataset = request['dataset']
+        start_from_launch_date = request['start_from_launch_date']
+        
+        # 选中的产品很多时显示汇总，开始时间为上架时间时按上架天数对齐
+        if len(selected_rows) > request['aggregate_threshold']:
+            aggregate = self.aggregates.get(dataset, selected_rows, start_from_launch_date)
+            return {'mode': 'clear'} if aggregate is None else {'mode': 'aggregate', 'aggregate': aggregate}
+        
+        # 收集选中行的绘图数据，跳过没有历史数据的行
+        from chart import series_for_row, series_xlim
+        plot_data = []
+        with profiling.span('selection.collect', rows=len(selected_rows)):
+            for row in sorted(selected_rows):
+                if cancelled():
+                    return None
+                data = series_for_row(dataset, row, self.colors)
+                if data is not None:
+                    plot_data.append(data)
+        if not plot_data:
+            return {'mode': 'clear'}
+        return {'mode': 'lines', 'series': plot_data, 'xlim': series_xlim(plot_data, start_from_launch_date)}
+    
+    def apply_chart(self, result):
+        """在界面线程中绘制prepare_chart()准备好的数据"""
+        try:
+            if result['mode'] == 'clear':
+                self.clear_plot()
+            elif result['mode'] == 'aggregate':
+                self.chart.show_aggregate(result['aggregate'])
+            else:
+                # 只增删变化的曲线
+                with profiling.span('chart.update', series=len(result['series'])):
+                    self.chart.update(result['series'], result['xlim'])
         except Exception as e:
             print(f"更新图表时出错: {str(e)}")
             import traceback
@@ -388,75 +857,113 @@ class MainWindow(QMainWindow):
     
     def clear_plot(self):
         """清空图表"""
-        ax = self.figure.gca()
-        ax.clear()
-        ax.set_xlabel('时间', fontproperties=font)
-        ax.set_ylabel('销量', fontproperties=font)
-        ax.set_title('点击表格行显示销量趋势', fontproperties=font)
-        self.figure.tight_layout()
-        self.canvas.draw()
+        self.chart.clear()
     
     def load_data(self):
         """移除默认加载数据的行为"""
         # 初始化空表格
-        self.table.setRowCount(0)
-        self.table.setColumnCount(0)
-        
-        # 初始化空图表
-        ax = self.figure.add_subplot(111)
-        ax.clear()
-        ax.set_xlabel('时间', fontproperties=font)
-        ax.set_ylabel('销量', fontproperties=font)
-        ax.set_title('点击表格行显示销量趋势', fontproperties=font)
-        self.canvas.draw()
-    
-    def download_image(self, url):
-        """下载图片并返回本地路径"""
-        try:
-            # 使用URL的MD5作为文件名
-            filename = hashlib.md5(url.encode()).hexdigest() + '.jpg'
-            local_path = os.path.join('imgs', filename)
-            
-            # 如果图片已存在，直接返回路径
-            if os.path.exists(local_path):
-                return local_path
-            
-            # 下载图片
-            response = requests.get(url, timeout=10)
-            if response.status_code == 200:
-                with open(local_path, 'wb') as f:
-                    f.write(response.content)
-                return local_path
-        except Exception as e:
-            print(f"下载图片失败: {str(e)}")
-        return None
-
-    def create_image_label(self, image_path):
-        """创建图片标签并设置图片"""
-        label = QLabel()
-        pixmap = QPixmap(image_path)
-        scaled_pixmap = pixmap.scaled(80, 80, Qt.KeepAspectRatio, Qt.SmoothTransformation)
-        label.setPixmap(scaled_pixmap)
-        return label
+        self.table_model.set_dataset(None)
+        
+        # 窗口显示之后再创建空图表
+        self.run_after_first_paint(self.create_chart)
+    
+    def selected_rows(self):
+        """返回所有选中行的行号"""
+        source_row = self.table_model.source_row
+        return set(source_row(index.row()) for index in self.table.selectionModel().selectedRows())
+    
+    def prefetch_images(self):
+        """按设置预下载全部图片或可见行的图片"""
+        if self.dataset is None:
+            return
+        if self.settings.get('prefetch_all_images', False):
+            self.download_missing_images(self.dataset.df.iloc[:, self.dataset.image_col])
+        else:
+            self.prefetch_visible_images()
+    
+    def prefetch_visible_images(self):
+        """下载可见行中还没有缓存的图片"""
+        if self.dataset is None or len(self.dataset) == 0:
+            return
+        first = max(self.table.rowAt(0), 0)
+        last = self.table.rowAt(self.table.viewport().height())
+        if last < 0:
+            last = self.table_model.rowCount() - 1
+        source_row = self.table_model.source_row
+        self.download_missing_images(self.dataset.image_url(source_row(row)) for row in range(first, last + 1))
+    
+    def start_image_migration(self):
+        """在后台导入原来imgs目录中的图片，状态栏显示进度"""
+        migrator = ImageMigrator(self.image_store, parent=self)
+        migrator.progress.connect(self.on_migration_progress)
+        migrator.migrated.connect(self.on_images_migrated)
+        migrator.failed.connect(self.on_migration_failed)
+        migrator.finished.connect(self.on_migrator_finished)
+        self.image_migrator = migrator
+        migrator.start()
+    
+    def on_migration_progress(self, done, total):
+        self.statusBar().showMessage(f"正在导入原imgs目录中的图片 {done}/{total}")
+    
+    def on_images_migrated(self, imported):
+        if imported:
+            self.statusBar().showMessage(f"已导入{imported}张图片，原imgs目录中的文件未删除", 5000)
+    
+    def on_migration_failed(self, message):
+        print(f"导入图片失败: {message}")
+        self.statusBar().showMessage(f"导入图片失败: {message}", 5000)
+    
+    def on_migrator_finished(self):
+        """导入结束后显示已导入的图片，并补下载仍然没有的图片"""
+        self.image_migrator = None
+        self.thumbnails.forget_missing()
+        if self.dataset is not None:
+            self.table_model.refresh_column(self.dataset.image_col)
+        self.prefetch_images()
+    
+    def download_missing_images(self, urls):
+        """一次查询排除本地已有的图片，只下载其余的图片"""
+        # 导入原imgs目录期间不自动下载，避免重复下载正在导入的图片，导入结束后再补下载
+        if self.image_migrator is not None:
+            return
+        urls = [url for url in urls if isinstance(url, str)]
+        present = self.image_store.contains_many(urls)
+        self.image_downloader.enqueue(url for url in urls if url not in present)
+    
+    def on_image_downloaded(self, url):
+        """图片下载完成后，在可见的单元格中显示"""
+        # 丢弃"没有图片"的记录，单元格重绘时重新读取
+        self.thumbnails.invalidate(url)
+        if self.dataset is not None:
+            self.table_model.refresh_column(self.dataset.image_col)
+    
+    def on_download_progress(self, done, total):
+        if done < total:
+            self.statusBar().showMessage(f"正在下载图片 {done}/{total}")
+        else:
+            self.statusBar().showMessage(f"图片下载完成，共{total}张", 3000)
 
-    def on_item_clicked(self, item):
+    def on_item_clicked(self, index):
         try:
-            row = item.row()
-            col = item.column()
-            df = pd.read_excel(self.current_file)
+            row = index.row()
+            col = index.column()
+            dataset = self.current_dataset()
+            if dataset is None:
+                return
             
             # 只处理图片链接列的点击
-            if col == df.columns.get_loc("图片链接"):
-                # 如果单元格中已经有图片，不需要处理
-                if self.table.cellWidget(row, col) is not None:
+            if col == dataset.image_col:
+                # 重新检查本地文件，如果单元格中已经有图片，不需要处理
+                image_url = dataset.image_url(self.table_model.source_row(row))
+                if not isinstance(image_url, str):
+                    return
+                self.thumbnails.invalidate(image_url)
+                if self.thumbnails.has_image(image_url):
+                    self.table_model.refresh_cell(row, col)
                     return
                     
-                # 获取图片链接并下载
-                image_url = df.iloc[row, col]
-                image_path = self.download_image(image_url)
-                if image_path:
-                    image_label = self.create_image_label(image_path)
-                    self.table.setCellWidget(row, col, image_label)
+                # 在后台下载，完成后自动显示
+                self.image_downloader.enqueue([image_url], retry_failed=True)
                 
         except Exception as e:
             print(f"加载图片时出错: {str(e)}")
@@ -465,60 +972,198 @@ class MainWindow(QMainWindow):
     
     def load_settings(self):
         """加载用户设置"""
-        try:
-            settings_path = os.path.join(os.path.expanduser('~'), '.excel_viewer_settings.json')
-            if os.path.exists(settings_path):
-                with open(settings_path, 'r', encoding='utf-8') as f:
-                    return json.load(f)
-        except Exception as e:
-            print(f"加载设置失败: {str(e)}")
-        return {}
+        return load_settings()
     
     def save_settings(self):
         """保存用户设置"""
-        try:
-            settings_path = os.path.join(os.path.expanduser('~'), '.excel_viewer_settings.json')
-            with open(settings_path, 'w', encoding='utf-8') as f:
-                json.dump(self.settings, f, ensure_ascii=False)
-        except Exception as e:
-            print(f"保存设置失败: {str(e)}")
+        save_settings(self.settings)
     
     def toggle_auto_load(self, checked):
         """切换自动加载设置"""
         self.settings['auto_load_last_file'] = checked
         self.save_settings()
     
+    def toggle_prefetch_all(self, checked):
+        """切换预下载全部图片设置"""
+        self.settings['prefetch_all_images'] = checked
+        self.save_settings()
+        if checked:
+            self.prefetch_images()
+    
+    def toggle_raw_data(self, checked):
+        """切换是否显示原始数据"""
+        self.settings['show_raw_data'] = checked
+        self.save_settings()
+        # 图表还未创建时，创建时会读取该设置
+        if self._chart is not None:
+            self._chart.set_raw(checked)
+    
+    def set_aggregate_threshold(self):
+        """设置显示汇总的选中行数"""
+        value, ok = QInputDialog.getInt(
+            self, '汇总显示', '选中行数超过该值时显示汇总:',
+            self.settings.get('aggregate_threshold', 50), 1, 1000000)
+        if not ok:
+            return
+        self.settings['aggregate_threshold'] = value
+        self.save_settings()
+        if self.table.selectionModel().hasSelection():
+            self.on_selection_change()
+    
+    def toggle_profiling(self, checked):
+        """切换性能分析，关闭时导出trace文件"""
+        self.settings['profiling'] = checked
+        self.save_settings()
+        self.set_profiling(checked)
+    
+    def set_profiling(self, enabled):
+        was_enabled = profiling.enabled()
+        profiling.set_enabled(enabled)
+        self.profiling_action.setChecked(enabled)
+        self.profile_label.setVisible(enabled)
+        if enabled:
+            self.profile_timer.start()
+        else:
+            self.profile_timer.stop()
+            if was_enabled:
+                self.export_trace()
+    
+    def update_profile_label(self):
+        """显示上次刷新之后耗时最长的几个阶段"""
+        stages = profiling.take_recent()
+        if stages:
+            self.profile_label.setText('  '.join(
+                f"{name} {duration * 1000:.1f}ms" for name, duration in stages[:5]))
+    
+    def export_trace(self):
+        try:
+            count = profiling.export_trace(self.trace_path)
+            profiling.clear()
+            self.statusBar().showMessage(f"性能记录已保存到 {self.trace_path}（{count}个事件）", 5000)
+        except Exception as e:
+            print(f"保存性能记录失败: {str(e)}")
+    
     def toggle_start_time(self, checked):
         """切换开始时间设置"""
         self.settings['start_from_launch_date'] = checked
         self.save_settings()
         # 如果有选中的行，立即更新图表
-        if self.table.selectedItems():
+        if self.table.selectionModel().hasSelection():
             self.on_selection_change()
 
     def on_header_clicked(self, logical_index):
         """处理表头点击事件"""
         try:
             # 获取点击的列的表头文本
-            header_text = self.table.horizontalHeaderItem(logical_index).text()
+            header_text = self.table_model.headerData(logical_index, Qt.Horizontal)
             
             # 如果点击的是ASIN列
             if header_text == "ASIN":
                 # 检查是否有任何行被选中
-                has_selection = bool(self.table.selectedItems())
+                has_selection = self.table.selectionModel().hasSelection()
                 
                 # 如果有选中的行，则取消全选；如果没有，则全选
                 if has_selection:
                     self.table.clearSelection()
                 else:
                     self.table.selectAll()
+            elif self.dataset is not None and self.loader is None:
+                # 其他列：按该列排序，再次点击时反向
+                if self.sort_column == logical_index:
+                    self.sort_descending = not self.sort_descending
+                else:
+                    self.sort_column = logical_index
+                    self.sort_descending = False
+                header = self.table.horizontalHeader()
+                header.setSortIndicatorShown(True)
+                header.setSortIndicator(logical_index, Qt.DescendingOrder if self.sort_descending
+                                        else Qt.AscendingOrder)
+                self.apply_filter()
         except Exception as e:
             print(f"处理表头点击时出错: {str(e)}")
             import traceback
             traceback.print_exc()
 
-if __name__ == '__main__':
+    def closeEvent(self, event):
+        """关闭窗口时停止后台读取，放弃未完成的下载"""
+        self.cancel_loading()
+        for loader in list(self.loaders):
+            loader.wait()
+        if self.image_migrator is not None:
+            self.image_migrator.requestInterruption()
+            self.image_migrator.wait()
+        self.image_downloader.shutdown()
+        self.chart_scheduler.shutdown()
+        if profiling.enabled():
+            self.export_trace()
+        super().closeEvent(event)
+
+def run_render(args):
+    """批量生成趋势图，不创建窗口"""
+    from render import render_workbook
+    from workbook_cache import WorkbookCache
+    settings = load_settings()
+    if args.start is None:
+        start_from_launch_date = settings.get('start_from_launch_date', True)
+    else:
+        start_from_launch_date = args.start == 'launch'
+    cache = WorkbookCache(max_bytes=settings.get('cache_max_mb', 512) * 1024 * 1024)
+    rendered, skipped, failed = render_workbook(
+        args.input, args.out, get_font(settings), fmt=args.format, workers=args.workers,
+        chunksize=args.chunksize, dpi=args.dpi, start_from_launch_date=start_from_launch_date,
+        force=args.force, cache=cache)
+    print(f"完成: 生成{rendered}张，未变化跳过{skipped}张，失败{failed}张")
+    return 1 if failed else 0
+
+def run_serve(args):
+    """运行本地HTTP看板，不创建窗口"""
+    from serve import ChartService, serve
+    from workbook_cache import WorkbookCache
+    settings = load_settings()
+    if args.start is None:
+        start_from_launch_date = settings.get('start_from_launch_date', True)
+    else:
+        start_from_launch_date = args.start == 'launch'
+    cache = WorkbookCache(max_bytes=settings.get('cache_max_mb', 512) * 1024 * 1024)
+    service = ChartService(
+        args.input, get_font(settings), cache=cache, start_from_launch_date=start_from_launch_date,
+        dpi=args.dpi, workers=args.workers, max_bytes=args.cache_mb * 1024 * 1024)
+    serve(service, args.host, args.port)
+    return 0
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Excel 数据可视化')
+    subparsers = parser.add_subparsers(dest='command')
+    render_parser = subparsers.add_parser('render', help='为每个ASIN批量生成销量趋势图')
+    render_parser.add_argument('--input', required=True, help='Excel文件或包含Excel文件的文件夹')
+    render_parser.add_argument('--out', required=True, help='输出目录')
+    render_parser.add_argument('--format', choices=['png', 'svg'], default='png')
+    render_parser.add_argument('--workers', type=int, default=None, help='进程数，默认为CPU核数')
+    render_parser.add_argument('--chunksize', type=int, default=None, help='每次分配给进程的图表数')
+    render_parser.add_argument('--dpi', type=int, default=100)
+    render_parser.add_argument('--start', choices=['launch', 'data'], default=None,
+                               help='x轴从上架日期或第一天数据开始，默认使用界面中的设置')
+    render_parser.add_argument('--force', action='store_true', help='忽略未变化的图，全部重新生成')
+    serve_parser = subparsers.add_parser('serve', help='运行本地HTTP看板，在浏览器中查看趋势图')
+    serve_parser.add_argument('--input', required=True, help='Excel文件或包含Excel文件的文件夹')
+    serve_parser.add_argument('--host', default='127.0.0.1', help='监听地址，0.0.0.0允许其他电脑访问')
+    serve_parser.add_argument('--port', type=int, default=8000)
+    serve_parser.add_argument('--workers', type=int, default=None, help='绘图进程数，默认为CPU核数')
+    serve_parser.add_argument('--dpi', type=int, default=100)
+    serve_parser.add_argument('--start', choices=['launch', 'data'], default=None,
+                              help='默认的x轴起点，默认使用界面中的设置')
+    serve_parser.add_argument('--cache-mb', type=int, default=64, help='已生成图片的缓存大小')
+    args = parser.parse_args(argv)
+    
+    if args.command == 'render':
+        return run_render(args)
+    if args.command == 'serve':
+        return run_serve(args)
+    
     app = QApplication(sys.argv)
     window = MainWindow()
     window.show()
-    sys.exit(app.exec_())
+    return app.exec_()
+
+if __name__ == '__main__':
+    sys.exit(main())
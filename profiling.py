@@ -0,0 +1,133 @@
+"""各处理阶段的耗时记录
+
+用法:
+    with profiling.span('chart.draw'):
+        ...
+
+未启用时span()返回共享的空对象，几乎没有开销。启用后记录每个阶段的开始时间和耗时，
+可以导出为Chrome trace-event格式的JSON（在Perfetto或chrome://tracing中打开）。
+设置环境变量EXCEL_VIEWER_PROFILE=1可在启动时启用，值为.json文件路径时同时指定导出位置。
+"""
+import json
+import os
+import threading
+import time
+from collections import deque
+
+ENV_VAR = 'EXCEL_VIEWER_PROFILE'
+DEFAULT_TRACE_PATH = os.path.join(os.path.expanduser('~'), 'excel_viewer_trace.json')
+
+# 最多保留的事件数，长时间运行时丢弃最早的事件
+MAX_EVENTS = 200000
+
+_enabled = False
+_lock = threading.Lock()
+_events = deque(maxlen=MAX_EVENTS)
+# 上次取走之后结束的阶段: [(名称, 耗时秒)]
+_recent = []
+_thread_names = {}
+_origin = time.perf_counter()
+
+
+class _NullSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class _Span:
+    __slots__ = ('name', 'args', 'start')
+
+    def __init__(self, name, args):
+        self.name = name
+        self.args = args
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        end = time.perf_counter()
+        _record(self.name, self.start, end, self.args)
+        return False
+
+
+def span(name, **args):
+    """记录with块的耗时，args会作为事件参数写入trace"""
+    if not _enabled:
+        return _NULL_SPAN
+    return _Span(name, args)
+
+
+def enabled():
+    return _enabled
+
+
+def set_enabled(on):
+    global _enabled
+    _enabled = bool(on)
+
+
+def env_trace_path():
+    """环境变量要求启用时返回导出路径，否则返回None"""
+    value = os.environ.get(ENV_VAR, '')
+    if not value or value == '0':
+        return None
+    return value if value.endswith('.json') else DEFAULT_TRACE_PATH
+
+
+def _record(name, start, end, args):
+    thread = threading.current_thread()
+    event = {
+        'name': name,
+        'ph': 'X',
+        'ts': (start - _origin) * 1e6,
+        'dur': (end - start) * 1e6,
+        'pid': os.getpid(),
+        'tid': thread.ident,
+    }
+    if args:
+        event['args'] = args
+    with _lock:
+        _events.append(event)
+        _recent.append((name, end - start))
+        _thread_names.setdefault(thread.ident, thread.name)
+
+
+def take_recent():
+    """取走上次调用之后结束的阶段，按名称汇总为[(名称, 总耗时秒)]，耗时长的在前"""
+    global _recent
+    with _lock:
+        recent, _recent = _recent, []
+    totals = {}
+    for name, duration in recent:
+        totals[name] = totals.get(name, 0) + duration
+    return sorted(totals.items(), key=lambda item: item[1], reverse=True)
+
+
+def export_trace(path):
+    """把已记录的事件写入Chrome trace-event JSON文件，返回事件数"""
+    with _lock:
+        events = list(_events)
+        thread_names = dict(_thread_names)
+    pid = os.getpid()
+    metadata = [{'name': 'thread_name', 'ph': 'M', 'pid': pid, 'tid': tid, 'args': {'name': name}}
+                for tid, name in thread_names.items()]
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump({'traceEvents': metadata + events, 'displayTimeUnit': 'ms'}, f, ensure_ascii=False)
+    os.replace(tmp_path, path)
+    return len(events)
+
+
+def clear():
+    with _lock:
+        _events.clear()
+        _recent.clear()
@@ -0,0 +1,168 @@
+"""不启动界面，批量生成工作簿中每个ASIN的销量趋势图
+
+绘图使用Agg画布，由进程池分块并行完成。输出目录中的render_manifest.json记录
+每张图的输入摘要，数据和绘图参数都没有变化的图会被跳过。
+"""
+import hashlib
+import io
+import json
+import os
+import re
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
+
+from chart import SalesChart, series_for_row, series_xlim
+from colors import ColorAssigner
+from dataset import ExcelDataset
+from workspace import open_workspace
+
+# 绘图方式改变时加1，使已有的图全部重新生成
+RENDER_VERSION = 1
+MANIFEST_NAME = 'render_manifest.json'
+
+
+class _RenderCanvas(FigureCanvasAgg):
+    """离屏画布，只在保存图片时绘制"""
+
+    def draw_idle(self, *args, **kwargs):
+        pass
+
+
+# 每个工作进程复用同一个图表
+_chart = None
+_options = None
+
+
+def init_worker(font, figsize, fmt, dpi):
+    """进程池的initializer，在工作进程中创建复用的图表"""
+    global _chart, _options
+    figure = Figure(figsize=figsize)
+    _chart = SalesChart(figure, _RenderCanvas(figure), font)
+    _options = {'format': fmt, 'dpi': dpi}
+
+
+def _render_job(job):
+    """绘制一个ASIN并保存，返回(文件名, 摘要)，失败时摘要为None"""
+    data, xlim, out_path, key = job
+    try:
+        _chart.update([data], xlim)
+        _chart.figure.tight_layout()
+        # 先写临时文件再改名，中断时不会留下不完整的图片
+        tmp_path = out_path + '.part'
+        _chart.figure.savefig(tmp_path, **_options)
+        os.replace(tmp_path, out_path)
+        return os.path.basename(out_path), key
+    except Exception as e:
+        print(f"生成{data['asin']}的趋势图失败: {str(e)}")
+        return os.path.basename(out_path), None
+
+
+def render_chart(job):
+    """在工作进程中绘制一张包含一个或多个ASIN的图，返回图片内容"""
+    series, xlim, fmt = job
+    # 工作进程复用同一个图表，重新读取文件后同一ASIN的数据可能已变化，不能沿用上次的曲线
+    _chart.invalidate([data['asin'] for data in series])
+    _chart.update(series, xlim)
+    _chart.figure.tight_layout()
+    buffer = io.BytesIO()
+    _chart.figure.savefig(buffer, **dict(_options, format=fmt))
+    return buffer.getvalue()
+
+
+def load_input(input_path, cache=None):
+    """读取工作簿，input_path为文件夹时合并其中的全部工作簿"""
+    if os.path.isdir(input_path):
+        return open_workspace(input_path, cache)
+    return ExcelDataset.load(input_path, cache)
+
+
+def output_name(asin, fmt):
+    """ASIN对应的输出文件名，去掉文件名中不能使用的字符"""
+    return re.sub(r'[^\w.-]', '_', str(asin)) + '.' + fmt
+
+
+def job_key(data, xlim, font, fmt, dpi, figsize):
+    """一张图全部输入的摘要"""
+    digest = hashlib.sha1()
+    params = (RENDER_VERSION, fmt, dpi, figsize, str(font), str(data['asin']), data['title'],
+              data['color'], str(xlim[0]), str(xlim[1]))
+    digest.update(repr(params).encode())
+    digest.update(data['dates'].tobytes())
+    digest.update(data['sales'].tobytes())
+    return digest.hexdigest()
+
+
+def load_manifest(out_dir):
+    try:
+        with open(os.path.join(out_dir, MANIFEST_NAME), 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def save_manifest(out_dir, manifest):
+    path = os.path.join(out_dir, MANIFEST_NAME)
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False)
+    os.replace(tmp_path, path)
+
+
+def render_workbook(input_path, out_dir, font, fmt='png', workers=None, chunksize=None, dpi=100,
+                    figsize=(8, 4.5), start_from_launch_date=True, force=False, cache=None):
+    """为工作簿（或工作区文件夹）中每个有历史数据的ASIN生成一张趋势图
+
+    颜色按行顺序分配，与在界面中全选时一致；同一ASIN只绘制第一行。
+    返回(生成数, 跳过数, 失败数)。
+    """
+    dataset = load_input(input_path, cache)
+    os.makedirs(out_dir, exist_ok=True)
+    manifest = {} if force else load_manifest(out_dir)
+
+    colors = ColorAssigner()
+    seen = set()
+    jobs = []
+    skipped = 0
+    for row in range(len(dataset)):
+        asin = dataset.asin(row)
+        if pd.isna(asin) or asin in seen:
+            continue
+        seen.add(asin)
+        data = series_for_row(dataset, row, colors)
+        if data is None:
+            continue
+        xlim = series_xlim([data], start_from_launch_date)
+        name = output_name(asin, fmt)
+        out_path = os.path.join(out_dir, name)
+        key = job_key(data, xlim, font, fmt, dpi, figsize)
+        if manifest.get(name) == key and os.path.exists(out_path):
+            skipped += 1
+            continue
+        jobs.append((data, xlim, out_path, key))
+
+    rendered = failed = 0
+    if jobs:
+        workers = workers or os.cpu_count() or 1
+        # 分块提交，减少进程间通信的次数
+        chunksize = chunksize or max(1, min(64, len(jobs) // (workers * 4)))
+        start = time.perf_counter()
+        try:
+            with ProcessPoolExecutor(max_workers=workers, initializer=init_worker,
+                                     initargs=(font, figsize, fmt, dpi)) as executor:
+                for i, (name, key) in enumerate(executor.map(_render_job, jobs, chunksize=chunksize), 1):
+                    if key is None:
+                        failed += 1
+                        manifest.pop(name, None)
+                    else:
+                        rendered += 1
+                        manifest[name] = key
+                    if i % 100 == 0 or i == len(jobs):
+                        print(f"已生成 {i}/{len(jobs)}，用时{time.perf_counter() - start:.1f}s")
+        finally:
+            # 中断时也保存已完成的部分
+            save_manifest(out_dir, manifest)
+    return rendered, skipped, failed
@@ -0,0 +1,53 @@
+"""文件被重新写入后，按ASIN和行内容哈希比较新旧数据集
+
+同一ASIN出现多次时按出现的先后分别对应。比较结果中新数据集的行被重新排列：
+仍然存在的行按旧数据集中的顺序排在前面，新增的行排在最后，
+这样表格只需删除、重绘和追加变化的行，选中状态和滚动位置不受影响。
+"""
+import numpy as np
+import pandas as pd
+
+
+def row_keys(dataset):
+    """每行的ASIN加上该ASIN第几次出现，作为对应新旧行的键"""
+    asins = dataset.df.iloc[:, dataset.asin_col].astype(str)
+    occurrence = asins.groupby(asins, sort=False).cumcount()
+    return (asins + '\0' + occurrence.astype(str)).to_numpy()
+
+
+def row_hashes(dataset):
+    """每行全部单元格内容的哈希(uint64)"""
+    # 转为字符串后再计算，避免缓存和xlsx读取的列类型不同时误判为变化
+    return pd.util.hash_pandas_object(dataset.df.astype(str), index=False).to_numpy()
+
+
+def diff_datasets(old, new):
+    """比较新旧数据集，列不同时返回None（需要整表重新显示）
+
+    返回字典:
+        dataset: 重新排列后的新数据集
+        old_to_new: 旧数据集每行在新数据集中的行号，已删除的为-1
+        changed: 内容变化的行（新行号）
+        added: 新增的行数，排在新数据集末尾
+        removed: 删除的行数
+    """
+    if [str(c) for c in old.df.columns] != [str(c) for c in new.df.columns]:
+        return None
+    old_keys = row_keys(old)
+    new_keys = row_keys(new)
+    positions = pd.Index(new_keys).get_indexer(old_keys)
+    kept = positions >= 0
+    is_new = np.ones(len(new), dtype=bool)
+    is_new[positions[kept]] = False
+    take = np.concatenate([positions[kept], np.flatnonzero(is_new)])
+
+    old_to_new = np.full(len(old), -1, dtype=np.int64)
+    old_to_new[kept] = np.arange(int(kept.sum()))
+    changed = np.flatnonzero(row_hashes(old)[kept] != row_hashes(new)[positions[kept]])
+    return {
+        'dataset': new.take(take),
+        'old_to_new': old_to_new,
+        'changed': changed,
+        'added': int(is_new.sum()),
+        'removed': int((~kept).sum()),
+    }
@@ -0,0 +1,192 @@
+"""表格筛选和排序用的索引
+
+ASIN使用哈希索引精确查找，标题使用三字符(trigram)倒排索引做子串查找，
+数值和日期列保存排序后的数组，范围查询和排序都只需二分查找。
+索引在第一次用到时建立，之后的查询和排序都不需要遍历表格。
+"""
+import re
+
+import numpy as np
+import pandas as pd
+
+import profiling
+
+# 看起来像ASIN的查询词，此时按ASIN精确查找
+ASIN_PATTERN = re.compile(r'^[A-Z0-9]{10}$')
+
+
+def _exclusive_cumsum(values):
+    result = np.zeros(len(values), dtype=np.int64)
+    np.cumsum(values[:-1], out=result[1:])
+    return result
+
+
+class TitleIndex:
+    """标题的trigram倒排索引，不区分大小写
+
+    每个trigram对应包含它的行号（升序）；查询时取查询串所有trigram的行号交集，
+    再逐行确认确实包含查询串。
+    """
+
+    def __init__(self, titles):
+        self.titles = [title.lower() if isinstance(title, str) else '' for title in titles]
+        lengths = np.fromiter(map(len, self.titles), dtype=np.int64, count=len(self.titles))
+        codes = np.frombuffer(''.join(self.titles).encode('utf-32-le'), dtype=np.uint32).astype(np.int64)
+
+        # 每个标题的trigram在拼接文本中的起始位置
+        counts = np.maximum(lengths - 2, 0)
+        total = int(counts.sum())
+        positions = (np.repeat(_exclusive_cumsum(lengths) - _exclusive_cumsum(counts), counts)
+                     + np.arange(total))
+        # Unicode码位不超过21位，三个码位可以合成一个int64
+        keys = (codes[positions] << 42) | (codes[positions + 1] << 21) | codes[positions + 2]
+        rows = np.repeat(np.arange(len(self.titles), dtype=np.int32), counts)
+
+        # 稳定排序保证同一trigram的行号升序，再去掉同一行内重复的trigram
+        order = np.argsort(keys, kind='stable')
+        keys = keys[order]
+        rows = rows[order]
+        keep = np.ones(len(keys), dtype=bool)
+        keep[1:] = (keys[1:] != keys[:-1]) | (rows[1:] != rows[:-1])
+        keys = keys[keep]
+        self.rows = rows[keep]
+        self.keys, starts = np.unique(keys, return_index=True)
+        self.offsets = np.append(starts, len(keys))
+
+    @staticmethod
+    def _trigram_keys(text):
+        codes = [ord(c) for c in text]
+        return {(a << 42) | (b << 21) | c for a, b, c in zip(codes, codes[1:], codes[2:])}
+
+    def search(self, query):
+        """返回标题包含query的行号数组（升序）"""
+        query = query.lower()
+        if len(query) < 3:
+            return np.array([row for row, title in enumerate(self.titles) if query in title],
+                            dtype=np.int64)
+        postings = []
+        for key in self._trigram_keys(query):
+            i = np.searchsorted(self.keys, key)
+            if i == len(self.keys) or self.keys[i] != key:
+                return np.empty(0, dtype=np.int64)
+            postings.append(self.rows[self.offsets[i]:self.offsets[i + 1]])
+        # 从最短的倒排表开始求交集
+        postings.sort(key=len)
+        candidates = postings[0]
+        for rows in postings[1:]:
+            candidates = np.intersect1d(candidates, rows, assume_unique=True)
+            if len(candidates) == 0:
+                break
+        titles = self.titles
+        return np.array([row for row in candidates.tolist() if query in titles[row]], dtype=np.int64)
+
+
+class SortedColumn:
+    """数值或日期列排序后的值和对应行号，NaN排在最后"""
+
+    def __init__(self, values):
+        self.order = np.argsort(values, kind='stable')
+        self.values = values[self.order]
+        self.valid = len(values) - int(np.isnan(values).sum())
+
+    def range(self, low=None, high=None):
+        """返回值在[low, high]内的行号"""
+        start = 0 if low is None else np.searchsorted(self.values[:self.valid], low, side='left')
+        stop = self.valid if high is None else np.searchsorted(self.values[:self.valid], high, side='right')
+        return self.order[start:stop]
+
+
+class SearchIndex:
+    """一个数据集的全部索引，各索引在第一次使用时建立"""
+
+    def __init__(self, dataset):
+        self.dataset = dataset
+        self._asins = None
+        self._titles = None
+        self._sorted = {}
+        self._text_orders = {}
+
+    def range_columns(self):
+        """可以按范围筛选的列：数值列、日期列和上架日期列"""
+        df = self.dataset.df
+        columns = []
+        for i in range(len(df.columns)):
+            kind = df.dtypes.iloc[i].kind if isinstance(df.dtypes.iloc[i], np.dtype) else 'O'
+            if (kind in 'iufM' or i == self.dataset.launch_date_col) and df.iloc[:, i].notna().any():
+                columns.append(i)
+        return columns
+
+    def is_date_column(self, col):
+        dtype = self.dataset.df.dtypes.iloc[col]
+        return col == self.dataset.launch_date_col or (isinstance(dtype, np.dtype) and dtype.kind == 'M')
+
+    def asin_rows(self, asins):
+        """按ASIN精确查找，返回行号数组"""
+        if self._asins is None:
+            with profiling.span('index.asin'):
+                self._asins = {}
+                for row, asin in enumerate(self.dataset.df.iloc[:, self.dataset.asin_col].tolist()):
+                    if isinstance(asin, str):
+                        self._asins.setdefault(asin.strip().upper(), []).append(row)
+        rows = [row for asin in asins for row in self._asins.get(asin, ())]
+        return np.unique(np.array(rows, dtype=np.int64))
+
+    def title_rows(self, query):
+        if self._titles is None:
+            title_col = self.dataset.title_col
+            titles = self.dataset.df.iloc[:, title_col].tolist() if title_col is not None else []
+            with profiling.span('index.title', rows=len(titles)):
+                self._titles = TitleIndex(titles)
+        return self._titles.search(query)
+
+    def text_rows(self, text):
+        """搜索框的查询：全部是ASIN时按ASIN查找，否则在标题中查找子串"""
+        tokens = re.split(r'[\s,，]+', text.strip())
+        if tokens and all(ASIN_PATTERN.match(token.upper()) for token in tokens):
+            return self.asin_rows([token.upper() for token in tokens])
+        return self.title_rows(text.strip())
+
+    def sorted_column(self, col):
+        column = self._sorted.get(col)
+        if column is None:
+            with profiling.span('index.sorted', column=col):
+                column = self._sorted[col] = SortedColumn(self._numeric_values(col))
+        return column
+
+    def _numeric_values(self, col):
+        """把列转换为float64，日期为距1970-01-01的天数，无法转换的为NaN"""
+        series = self.dataset.df.iloc[:, col]
+        if self.is_date_column(col):
+            dates = pd.to_datetime(series, errors='coerce').to_numpy().astype('datetime64[D]')
+            values = dates.astype(np.int64).astype(np.float64)
+            values[np.isnat(dates)] = np.nan
+            return values
+        return pd.to_numeric(series, errors='coerce').to_numpy(dtype=np.float64, na_value=np.nan)
+
+    def parse_bound(self, col, text):
+        """把范围输入框的文字转换为该列的数值，空白时返回None，无法解析时抛出ValueError"""
+        text = text.strip()
+        if not text:
+            return None
+        if self.is_date_column(col):
+            date = pd.to_datetime(text, errors='coerce')
+            if pd.isna(date):
+                raise ValueError(f'无法识别的日期: {text}')
+            return float(date.to_datetime64().astype('datetime64[D]').astype(np.int64))
+        return float(text)
+
+    def range_rows(self, col, low=None, high=None):
+        return self.sorted_column(col).range(low, high)
+
+    def sort_order(self, col, descending=False):
+        """按某列排序后的行号，空值始终排在最后"""
+        if col in self.range_columns():
+            column = self.sorted_column(col)
+            valid = column.order[:column.valid]
+            return np.concatenate([valid[::-1] if descending else valid, column.order[column.valid:]])
+        order = self._text_orders.get(col)
+        if order is None:
+            with profiling.span('index.text_sort', column=col):
+                values = self.dataset.df.iloc[:, col].astype(str).to_numpy(dtype=object)
+                order = self._text_orders[col] = np.argsort(values, kind='stable')
+        return order[::-1] if descending else order
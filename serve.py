@@ -0,0 +1,285 @@
+"""本地HTTP看板：在浏览器中查看产品列表和销量趋势图，不需要安装桌面程序
+
+    /               产品列表页面，勾选产品后查看趋势图
+    /products       产品列表(JSON)
+    /chart.png      一个或多个ASIN的趋势图，参数asin可重复或用逗号分隔，
+    /chart.svg      start=launch|data指定x轴从上架日期或第一天数据开始
+
+工作簿用与界面相同的方式读取（列式缓存、文件夹合并），文件变化后自动重新读取。
+图由进程池绘制；生成的图按(ASIN集合, 绘图参数, 文件版本)保存在按字节数限制大小的LRU中，
+多个请求同时需要同一张图时只绘制一次。
+"""
+import html
+import json
+import multiprocessing
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, quote, urlsplit
+
+import pandas as pd
+
+import profiling
+from chart import series_for_row, series_xlim
+from colors import ColorAssigner
+from render import init_worker, load_input, render_chart
+
+# 一张图最多包含的ASIN数
+MAX_CHART_ASINS = 50
+
+# 检查文件是否变化的最短间隔（秒），文件夹需要扫描全部工作簿
+STALE_CHECK_INTERVAL = 1.0
+
+CONTENT_TYPES = {'png': 'image/png', 'svg': 'image/svg+xml'}
+
+
+class ChartCache:
+    """按字节数限制大小的LRU，可以在多个线程中使用"""
+
+    def __init__(self, max_bytes=64 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            data = self._entries.get(key)
+            if data is not None:
+                self._entries.move_to_end(key)
+            return data
+
+    def put(self, key, data):
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._bytes -= len(old)
+            self._entries[key] = data
+            self._bytes += len(data)
+            while self._bytes > self.max_bytes and len(self._entries) > 1:
+                _, removed = self._entries.popitem(last=False)
+                self._bytes -= len(removed)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+
+class ChartService:
+    """读取工作簿并按需绘制趋势图，供多个请求线程同时使用"""
+
+    def __init__(self, input_path, font, cache=None, start_from_launch_date=True, dpi=100,
+                 figsize=(8, 4.5), workers=None, max_bytes=64 * 1024 * 1024):
+        self.input_path = input_path
+        self.cache = cache
+        self.start_from_launch_date = start_from_launch_date
+        self.dpi = dpi
+        self.figsize = figsize
+        self.charts = ChartCache(max_bytes)
+        # 重新读取文件后同一ASIN仍使用原来的颜色
+        self.colors = ColorAssigner()
+        self._lock = threading.Lock()
+        self._in_flight = {}
+        self._version = 0
+        self._checked = 0
+        self._state = None
+        self._load()
+        # 请求线程运行时才启动工作进程，用spawn避免在多线程进程中fork
+        self._executor = ProcessPoolExecutor(max_workers=workers,
+                                             mp_context=multiprocessing.get_context('spawn'),
+                                             initializer=init_worker,
+                                             initargs=(font, figsize, 'png', dpi))
+
+    def _load(self):
+        with profiling.span('serve.load'):
+            dataset = load_input(self.input_path, self.cache)
+        # 同一ASIN只使用第一行，颜色按行顺序分配，与界面中全选和批量生成时一致
+        rows = {}
+        for row in range(len(dataset)):
+            asin = dataset.asin(row)
+            if pd.isna(asin) or str(asin) in rows:
+                continue
+            rows[str(asin)] = row
+            if dataset.histories.has_history(row):
+                self.colors.color_for(asin)
+        self._version += 1
+        self._state = (dataset, rows, self._version)
+        self._checked = time.monotonic()
+        self.charts.clear()
+
+    def state(self):
+        """返回(数据集, {ASIN: 行}, 版本)，文件变化后先重新读取"""
+        if time.monotonic() - self._checked >= STALE_CHECK_INTERVAL:
+            with self._lock:
+                if time.monotonic() - self._checked >= STALE_CHECK_INTERVAL:
+                    self._checked = time.monotonic()
+                    if self._state[0].is_stale():
+                        print(f"文件已变化，重新读取: {self.input_path}")
+                        self._load()
+        return self._state
+
+    def products(self):
+        """产品列表，按工作簿中的行顺序"""
+        dataset, rows, version = self.state()
+        products = []
+        for asin, row in rows.items():
+            launch_date = dataset.launch_date(row)
+            has_history = bool(dataset.histories.has_history(row))
+            products.append({
+                'asin': asin,
+                'title': dataset.title(row),
+                'launch_date': None if pd.isna(launch_date) else str(launch_date)[:10],
+                'has_history': has_history,
+                'color': self.colors.color_for(dataset.asin(row)) if has_history else None,
+            })
+        return {'version': version, 'products': products}
+
+    def chart(self, asins, fmt='png', start_from_launch_date=None):
+        """返回图片内容
+
+        未知的ASIN引发KeyError，ASIN过多或都没有历史数据时引发ValueError。
+        """
+        if start_from_launch_date is None:
+            start_from_launch_date = self.start_from_launch_date
+        dataset, rows, version = self.state()
+        unknown = [asin for asin in asins if asin not in rows]
+        if unknown:
+            raise KeyError(', '.join(unknown))
+        # ASIN集合相同的请求使用同一张图，曲线按行顺序绘制
+        asins = sorted(set(asins), key=rows.get)
+        if not asins or len(asins) > MAX_CHART_ASINS:
+            raise ValueError(f'每张图需要1到{MAX_CHART_ASINS}个ASIN')
+        key = (tuple(asins), fmt, start_from_launch_date, self.dpi, self.figsize, version)
+
+        data = self.charts.get(key)
+        if data is not None:
+            return data
+        with self._lock:
+            # 在锁内再查一次：等锁期间可能有任务完成，结果已放入缓存并从_in_flight中移除
+            data = self.charts.get(key)
+            if data is not None:
+                return data
+            future = self._in_flight.get(key)
+            submitted = future is None
+            if submitted:
+                series = []
+                for asin in asins:
+                    data = series_for_row(dataset, rows[asin], self.colors)
+                    if data is not None:
+                        series.append(data)
+                if not series:
+                    raise ValueError('没有历史数据')
+                xlim = series_xlim(series, start_from_launch_date)
+                future = self._executor.submit(render_chart, (series, xlim, fmt))
+                self._in_flight[key] = future
+        if submitted:
+            # 已完成的future会在当前线程中立即调用，不能在持有锁时注册
+            future.add_done_callback(lambda future: self._finish(key, future))
+        with profiling.span('serve.render', asins=len(asins), format=fmt):
+            return future.result()
+
+    def _finish(self, key, future):
+        # 先放入缓存再移除，之后的请求总能找到其中之一
+        if not future.cancelled() and future.exception() is None:
+            self.charts.put(key, future.result())
+        with self._lock:
+            self._in_flight.pop(key, None)
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+def _parse_asins(query):
+    asins = []
+    for value in query.get('asin', []):
+        asins.extend(asin.strip() for asin in value.split(',') if asin.strip())
+    return asins
+
+
+def render_index(products):
+    """产品列表页面"""
+    rows = []
+    for product in products['products']:
+        asin = html.escape(product['asin'])
+        if product['has_history']:
+            checkbox = f'<input type="checkbox" name="asin" value="{asin}">'
+            link = f'<a href="/chart.png?asin={quote(product["asin"])}" target="_blank">{asin}</a>'
+            swatch = f'<span style="color:{product["color"]}">&#9632;</span>'
+        else:
+            checkbox, link, swatch = '', asin, ''
+        rows.append(f'<tr><td>{checkbox}</td><td>{swatch} {link}</td>'
+                    f'<td>{html.escape(product["title"])}</td>'
+                    f'<td>{product["launch_date"] or ""}</td></tr>')
+    return f'''<!DOCTYPE html>
+<html><head><meta charset="utf-8"><title>销量趋势</title></head>
+<body>
+<form action="/chart.png" method="get" target="_blank">
+<p><button type="submit">查看选中产品的趋势图</button>
+<select name="start"><option value="launch">从上架日期开始</option><option value="data">从第一天数据开始</option></select></p>
+<table border="1" cellspacing="0" cellpadding="4">
+<tr><th></th><th>ASIN</th><th>标题</th><th>上架日期</th></tr>
+{''.join(rows)}
+</table>
+</form>
+</body></html>'''
+
+
+class DashboardHandler(BaseHTTPRequestHandler):
+    """处理看板的GET请求，self.server.service为ChartService"""
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        query = parse_qs(url.query)
+        service = self.server.service
+        try:
+            if url.path == '/':
+                body = render_index(service.products()).encode('utf-8')
+                self._send(200, 'text/html; charset=utf-8', body)
+            elif url.path == '/products':
+                body = json.dumps(service.products(), ensure_ascii=False).encode('utf-8')
+                self._send(200, 'application/json; charset=utf-8', body)
+            elif url.path in ('/chart.png', '/chart.svg'):
+                fmt = url.path.rsplit('.', 1)[1]
+                start = query.get('start', [None])[0]
+                if start not in (None, 'launch', 'data'):
+                    self.send_error(400, explain='start只能为launch或data')
+                    return
+                body = service.chart(_parse_asins(query), fmt,
+                                     None if start is None else start == 'launch')
+                self._send(200, CONTENT_TYPES[fmt], body)
+            else:
+                self.send_error(404)
+        except KeyError as e:
+            self.send_error(404, explain=f'未知的ASIN: {e.args[0]}')
+        except ValueError as e:
+            self.send_error(400, explain=str(e))
+        except Exception as e:
+            print(f"处理请求失败: {self.path} {str(e)}")
+            import traceback
+            traceback.print_exc()
+            self.send_error(500, explain=str(e))
+
+    def _send(self, status, content_type, body):
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+def serve(service, host='127.0.0.1', port=8000):
+    """运行看板，直到按Ctrl+C"""
+    server = ThreadingHTTPServer((host, port), DashboardHandler)
+    server.daemon_threads = True
+    server.service = service
+    print(f"看板已启动: http://{host}:{server.server_port}/")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        service.shutdown()
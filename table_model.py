@@ -0,0 +1,148 @@
+import numpy as np
+from PyQt5.QtCore import QAbstractTableModel, QModelIndex, Qt
+
+
+class DataFrameModel(QAbstractTableModel):
+    """直接由数据集提供单元格内容的表格模型，只格式化视图中可见的单元格
+
+    筛选和排序只改变显示的行号数组，视图中的行号通过source_row()转换为数据集的行号。
+    """
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.dataset = None
+        self._columns = []
+        self._headers = []
+        # 显示的数据集行号，None表示按原顺序显示全部行
+        self._order = None
+        self._inverse = None
+
+    def set_dataset(self, dataset):
+        """切换数据集，dataset为None时清空表格"""
+        self.beginResetModel()
+        self.dataset = dataset
+        self._order = None
+        self._inverse = None
+        if dataset is None:
+            self._columns = []
+            self._headers = []
+        else:
+            self._columns = self._column_series(dataset.df)
+            self._headers = [str(c) for c in dataset.df.columns]
+        self.endResetModel()
+
+    def set_row_order(self, order):
+        """只按order（数据集行号数组）的顺序显示这些行，None时按原顺序显示全部行"""
+        self.beginResetModel()
+        self._order = order
+        self._inverse = None
+        self.endResetModel()
+
+    def is_filtered(self):
+        return self._order is not None
+
+    def source_row(self, row):
+        """视图行号对应的数据集行号"""
+        return row if self._order is None else int(self._order[row])
+
+    def view_row(self, source_row):
+        """数据集行号在视图中的行号，没有显示时返回-1"""
+        if self._order is None:
+            return source_row
+        if self._inverse is None:
+            self._inverse = np.full(len(self.dataset), -1, dtype=np.int64)
+            self._inverse[self._order] = np.arange(len(self._order))
+        return int(self._inverse[source_row])
+
+    def rows_appended(self):
+        """数据集在末尾追加行后调用，只通知视图插入新行（只用于未筛选时）"""
+        first = self.rowCount()
+        last = len(self.dataset) - 1
+        if last < first:
+            return
+        self.beginInsertRows(QModelIndex(), first, last)
+        self._columns = self._column_series(self.dataset.df)
+        self.endInsertRows()
+
+    def patch_dataset(self, dataset, old_to_new, changed):
+        """文件重新读取后就地换成新数据集，只通知视图删除、重绘和追加变化的行
+
+        old_to_new为旧数据集每行在新数据集中的行号（已删除的为-1），仍然存在的行在新数据集中
+        按原顺序排在前面，新增的行排在最后；changed为内容变化的行（新行号）。
+        筛选或排序时新增的行不会显示，需要重新筛选。
+        """
+        filtered = self._order is not None
+        order = self._order if filtered else np.arange(len(self.dataset))
+        self._order = order
+        self._inverse = None
+        # 从后往前删除连续的已删除行，视图中保留的行号随之前移
+        removed = np.flatnonzero(old_to_new[order] < 0)
+        if len(removed):
+            breaks = np.flatnonzero(np.diff(removed) != 1)
+            starts = removed[np.concatenate([[0], breaks + 1])]
+            stops = removed[np.concatenate([breaks, [len(removed) - 1]])]
+            for start, stop in zip(starts[::-1].tolist(), stops[::-1].tolist()):
+                self.beginRemoveRows(QModelIndex(), start, stop)
+                self._order = np.delete(self._order, np.s_[start:stop + 1])
+                self.endRemoveRows()
+
+        self.dataset = dataset
+        self._columns = self._column_series(dataset.df)
+        self._order = old_to_new[self._order]
+        self._inverse = None
+        if len(changed):
+            view_rows = [row for row in (self.view_row(row) for row in changed.tolist()) if row >= 0]
+            if view_rows:
+                last_col = len(self._columns) - 1
+                self.dataChanged.emit(self.index(min(view_rows), 0), self.index(max(view_rows), last_col))
+        if filtered:
+            return
+        kept = len(self._order)
+        if len(dataset) > kept:
+            self.beginInsertRows(QModelIndex(), kept, len(dataset) - 1)
+            self._order = None
+            self.endInsertRows()
+        else:
+            self._order = None
+
+    @staticmethod
+    def _column_series(df):
+        return [df.iloc[:, j] for j in range(len(df.columns))]
+
+    def rowCount(self, parent=QModelIndex()):
+        if parent.isValid() or not self._columns:
+            return 0
+        if self._order is not None:
+            return len(self._order)
+        return len(self._columns[0])
+
+    def columnCount(self, parent=QModelIndex()):
+        if parent.isValid():
+            return 0
+        return len(self._columns)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        if role == Qt.DisplayRole:
+            return str(self._columns[index.column()].iat[self.source_row(index.row())])
+        return None
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if role != Qt.DisplayRole:
+            return None
+        if orientation == Qt.Horizontal:
+            return self._headers[section] if section < len(self._headers) else None
+        # 行号始终是文件中的行号
+        return str(self.source_row(section) + 1)
+
+    def refresh_cell(self, row, col):
+        """单元格内容变化后通知视图重绘"""
+        index = self.index(row, col)
+        self.dataChanged.emit(index, index)
+
+    def refresh_column(self, col):
+        """整列内容变化后通知视图，只有可见的单元格会重绘"""
+        if self.rowCount() == 0:
+            return
+        self.dataChanged.emit(self.index(0, col), self.index(self.rowCount() - 1, col))
@@ -0,0 +1,122 @@
+from collections import OrderedDict
+
+from PyQt5.QtCore import QBuffer, QByteArray, QIODevice, Qt
+from PyQt5.QtGui import QPixmap
+from PyQt5.QtWidgets import QApplication, QStyle, QStyledItemDelegate, QStyleOptionViewItem
+
+import profiling
+
+THUMBNAIL_SIZE = 80
+
+
+class ThumbnailCache:
+    """图片缩略图缓存
+
+    缩略图缩放一次后与原图一起保存在ImageStore中，
+    解码后的QPixmap保存在按字节数限制大小的LRU中。只能在界面线程中使用。
+    """
+
+    def __init__(self, store, max_bytes=64 * 1024 * 1024):
+        self.store = store
+        self.max_bytes = max_bytes
+        self._pixmaps = OrderedDict()
+        self._bytes = 0
+        # 本地没有图片的URL，避免每次重绘都查询
+        self._missing = set()
+
+    def has_image(self, url):
+        """本地是否已有该URL的图片（不解码）"""
+        if url in self._pixmaps:
+            return True
+        if url in self._missing:
+            return False
+        if self.store.contains(url):
+            return True
+        self._missing.add(url)
+        return False
+
+    def get(self, url):
+        """返回缩略图，本地没有图片时返回None"""
+        pixmap = self._pixmaps.get(url)
+        if pixmap is not None:
+            self._pixmaps.move_to_end(url)
+            return pixmap
+        if not isinstance(url, str) or not self.has_image(url):
+            return None
+        pixmap = self._load(url)
+        if pixmap is None:
+            self._missing.add(url)
+            return None
+        self._put(url, pixmap)
+        return pixmap
+
+    def invalidate(self, url):
+        """图片下载或更新后调用，下次访问时重新读取"""
+        self._missing.discard(url)
+        pixmap = self._pixmaps.pop(url, None)
+        if pixmap is not None:
+            self._bytes -= self._cost(pixmap)
+
+    def forget_missing(self):
+        """大量图片写入后调用（如导入原imgs目录），之前没有图片的URL下次访问时重新查询"""
+        self._missing.clear()
+
+    def _load(self, url):
+        data = self.store.get_thumbnail(url)
+        if data is not None:
+            with profiling.span('thumbnail.load'):
+                pixmap = QPixmap()
+                pixmap.loadFromData(data)
+            if not pixmap.isNull():
+                return pixmap
+        # 第一次显示时缩放原图，并保存缩略图供以后使用
+        with profiling.span('thumbnail.create'):
+            data = self.store.get(url)
+            pixmap = QPixmap()
+            if data is None or not pixmap.loadFromData(data):
+                return None
+            pixmap = pixmap.scaled(THUMBNAIL_SIZE, THUMBNAIL_SIZE, Qt.KeepAspectRatio,
+                                   Qt.SmoothTransformation)
+            encoded = QByteArray()
+            buffer = QBuffer(encoded)
+            buffer.open(QIODevice.WriteOnly)
+            pixmap.save(buffer, 'PNG')
+            self.store.put_thumbnail(url, bytes(encoded))
+        return pixmap
+
+    def _put(self, url, pixmap):
+        self._pixmaps[url] = pixmap
+        self._bytes += self._cost(pixmap)
+        while self._bytes > self.max_bytes and len(self._pixmaps) > 1:
+            _, evicted = self._pixmaps.popitem(last=False)
+            self._bytes -= self._cost(evicted)
+
+    @staticmethod
+    def _cost(pixmap):
+        return pixmap.width() * pixmap.height() * max(pixmap.depth(), 8) // 8
+
+
+class ThumbnailDelegate(QStyledItemDelegate):
+    """在图片链接列中绘制缩略图，只有可见的单元格会被绘制"""
+
+    def __init__(self, thumbnails, parent=None):
+        super().__init__(parent)
+        self.thumbnails = thumbnails
+
+    def paint(self, painter, option, index):
+        pixmap = self.thumbnails.get(index.data())
+        if pixmap is None:
+            # 没有图片时显示链接文字
+            super().paint(painter, option, index)
+            return
+
+        # 先绘制背景（包括选中状态），再居中绘制缩略图
+        opt = QStyleOptionViewItem(option)
+        self.initStyleOption(opt, index)
+        opt.text = ''
+        style = opt.widget.style() if opt.widget else QApplication.style()
+        style.drawControl(QStyle.CE_ItemViewItem, opt, painter, opt.widget)
+        rect = option.rect
+        x = rect.x() + (rect.width() - pixmap.width()) // 2
+        y = rect.y() + (rect.height() - pixmap.height()) // 2
+        painter.drawPixmap(x, y, pixmap)
@@ -0,0 +1,176 @@
+import hashlib
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+from history_store import HistoryStore
+
+# 缓存格式版本，格式变化时递增，旧缓存会被视为未命中
+CACHE_VERSION = 2
+
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser('~'), '.excel_viewer_cache')
+DEFAULT_MAX_BYTES = 512 * 1024 * 1024
+
+
+def file_content_hash(file_path):
+    """计算文件内容的SHA1"""
+    sha1 = hashlib.sha1()
+    with open(file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            sha1.update(chunk)
+    return sha1.hexdigest()
+
+
+def encode_strings(values):
+    """把字符串列编码为UTF-8字节缓冲区、偏移量和空值掩码"""
+    nulls = np.array([not isinstance(v, str) and pd.isna(v) for v in values], dtype=bool)
+    encoded = [b'' if null else str(v).encode('utf-8') for v, null in zip(values, nulls)]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    np.cumsum([len(b) for b in encoded], out=offsets[1:])
+    buffer = np.frombuffer(b''.join(encoded), dtype=np.uint8)
+    return buffer, offsets, nulls
+
+
+def decode_strings(buffer, offsets, nulls):
+    """encode_strings的逆操作"""
+    data = buffer.tobytes()
+    return [np.nan if null else data[start:end].decode('utf-8')
+            for start, end, null in zip(offsets[:-1], offsets[1:], nulls)]
+
+
+class WorkbookCache:
+    """工作簿解析结果的列式缓存，按文件路径、修改时间和内容哈希索引
+
+    每个工作簿对应缓存目录中的一个.npz文件，总大小超过上限时按最近使用时间淘汰。
+    工作区（文件夹）合并后的结果也以同样的格式保存，见load_workspace()。
+    """
+
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR, max_bytes=DEFAULT_MAX_BYTES):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+
+    def entry_path(self, file_path):
+        key = hashlib.md5(os.path.abspath(file_path).encode()).hexdigest()
+        return os.path.join(self.cache_dir, key + '.npz')
+
+    def workspace_entry_path(self, folder):
+        key = hashlib.md5(('workspace:' + os.path.abspath(folder)).encode()).hexdigest()
+        return os.path.join(self.cache_dir, key + '.npz')
+
+    def load(self, file_path):
+        """返回缓存的(DataFrame, HistoryStore)，未命中时返回None"""
+        loaded = self._load_entry(self.entry_path(file_path),
+                                  lambda meta: self._is_valid(meta, file_path))
+        return loaded[1:] if loaded is not None else None
+
+    def store(self, file_path, df, histories):
+        """写入缓存，histories为HistoryStore"""
+        try:
+            stat = os.stat(file_path)
+            meta = {
+                'path': os.path.abspath(file_path),
+                'mtime_ns': stat.st_mtime_ns,
+                'size': stat.st_size,
+                'sha1': file_content_hash(file_path),
+            }
+            self._store_entry(self.entry_path(file_path), meta, df, histories)
+        except Exception as e:
+            print(f"写入缓存失败: {str(e)}")
+
+    def load_workspace(self, folder):
+        """返回工作区上次合并的(文件清单, DataFrame, HistoryStore)，没有时返回None"""
+        loaded = self._load_entry(self.workspace_entry_path(folder),
+                                  lambda meta: meta.get('version') == CACHE_VERSION)
+        if loaded is None:
+            return None
+        meta, df, histories = loaded
+        return meta['files'], df, histories
+
+    def store_workspace(self, folder, files, df, histories):
+        """保存工作区合并结果，files为参与合并的文件清单"""
+        try:
+            meta = {'path': os.path.abspath(folder), 'files': files}
+            self._store_entry(self.workspace_entry_path(folder), meta, df, histories)
+        except Exception as e:
+            print(f"写入缓存失败: {str(e)}")
+
+    def _load_entry(self, entry, is_valid):
+        if not os.path.exists(entry):
+            return None
+        try:
+            with np.load(entry) as data:
+                meta = json.loads(str(data['meta']))
+                if not is_valid(meta):
+                    return None
+                df = self._decode_frame(meta, data)
+                histories = HistoryStore(data['hist_days'], data['hist_sales'],
+                                         data['hist_offsets'], data['hist_valid'])
+            # 更新修改时间，作为LRU淘汰依据
+            os.utime(entry)
+            return meta, df, histories
+        except Exception as e:
+            print(f"读取缓存失败: {str(e)}")
+            return None
+
+    def _store_entry(self, entry, meta, df, histories):
+        os.makedirs(self.cache_dir, exist_ok=True)
+        meta = dict(meta, version=CACHE_VERSION, columns=[str(c) for c in df.columns], kinds=[])
+        arrays = {}
+        for i in range(len(df.columns)):
+            series = df.iloc[:, i]
+            if isinstance(series.dtype, np.dtype) and series.dtype.kind in 'biufM':
+                meta['kinds'].append('array')
+                arrays[f'col_{i}'] = series.to_numpy()
+            else:
+                meta['kinds'].append('str')
+                buffer, offsets, nulls = encode_strings(series.tolist())
+                arrays[f'col_{i}'] = buffer
+                arrays[f'col_{i}_offsets'] = offsets
+                arrays[f'col_{i}_nulls'] = nulls
+        arrays.update(hist_days=histories.days, hist_sales=histories.sales,
+                      hist_offsets=histories.offsets, hist_valid=histories.valid)
+
+        # 先写临时文件再替换，避免留下不完整的缓存
+        tmp_path = entry + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            np.savez(f, meta=np.array(json.dumps(meta, ensure_ascii=False)), **arrays)
+        os.replace(tmp_path, entry)
+        self.evict()
+
+    def evict(self):
+        """总大小超过上限时，删除最久未使用的缓存"""
+        entries = []
+        for name in os.listdir(self.cache_dir):
+            if name.endswith('.npz'):
+                path = os.path.join(self.cache_dir, name)
+                stat = os.stat(path)
+                entries.append((stat.st_mtime, stat.st_size, path))
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            os.remove(path)
+            total -= size
+
+    def _is_valid(self, meta, file_path):
+        if meta.get('version') != CACHE_VERSION:
+            return False
+        stat = os.stat(file_path)
+        if meta['mtime_ns'] == stat.st_mtime_ns and meta['size'] == stat.st_size:
+            return True
+        # 修改时间变化但内容未变（如复制、同步）时仍然命中
+        return meta['size'] == stat.st_size and meta['sha1'] == file_content_hash(file_path)
+
+    def _decode_frame(self, meta, data):
+        columns = {}
+        for i, kind in enumerate(meta['kinds']):
+            if kind == 'array':
+                columns[i] = data[f'col_{i}']
+            else:
+                columns[i] = decode_strings(data[f'col_{i}'], data[f'col_{i}_offsets'],
+                                            data[f'col_{i}_nulls'])
+        df = pd.DataFrame(columns)
+        df.columns = meta['columns']
+        return df
@@ -0,0 +1,157 @@
+import os
+import threading
+
+from openpyxl import load_workbook
+from PyQt5.QtCore import QThread, pyqtSignal
+
+import profiling
+from dataset import HISTORY_COLUMN, ExcelDataset
+from history_store import HistoryStore
+from row_diff import diff_datasets
+from workspace import open_workspace
+
+
+class WorkbookLoader(QThread):
+    """在后台线程中以只读模式逐行读取工作簿，分批发出已读取的行
+
+    每批行的历史数据也在后台线程中解析，界面线程只需追加到数据集和表格。
+    第一批较小，使表格尽快出现内容。调用requestInterruption()可中途取消，
+    取消后不会再发出loaded信号。
+    """
+
+    # 表头: 列名列表
+    header_ready = pyqtSignal(list)
+    # 一批行: (行值元组列表, 这些行的HistoryStore)
+    batch_ready = pyqtSignal(list, object)
+    # 进度: (已读取行数, 估计总行数，未知时为0)
+    progress = pyqtSignal(int, int)
+    # 全部读取完成
+    loaded = pyqtSignal()
+    # 读取失败: 错误信息
+    failed = pyqtSignal(str)
+
+    def __init__(self, file_path, first_batch=200, batch_size=2000, parent=None):
+        super().__init__(parent)
+        self.file_path = file_path
+        self.first_batch = first_batch
+        self.batch_size = batch_size
+
+    def run(self):
+        threading.current_thread().name = 'workbook-loader'
+        try:
+            with profiling.span('xlsx.load'):
+                self._read()
+        except Exception as e:
+            self.failed.emit(str(e))
+
+    def _read(self):
+        with profiling.span('xlsx.open'):
+            workbook = load_workbook(self.file_path, read_only=True, data_only=True)
+        try:
+            sheet = workbook.active
+            total = max((sheet.max_row or 0) - 1, 0)
+            rows = sheet.iter_rows(values_only=True)
+            header = next(rows, None)
+            if header is None:
+                raise ValueError('工作表为空')
+            # 与pd.read_excel一致，空列名记为"Unnamed: i"
+            header = [name if name is not None else f'Unnamed: {i}' for i, name in enumerate(header)]
+            if HISTORY_COLUMN not in header:
+                raise ValueError(f'缺少列"{HISTORY_COLUMN}"')
+            history_col = header.index(HISTORY_COLUMN)
+            width = len(header)
+            self.header_ready.emit(header)
+
+            batch = []
+            loaded = 0
+            size = self.first_batch
+            for values in rows:
+                if self.isInterruptionRequested():
+                    return
+                # 跳过整行为空的行（通常是文件末尾只有格式的行）
+                if all(value is None for value in values):
+                    continue
+                values = tuple(values[:width])
+                batch.append(values + (None,) * (width - len(values)))
+                if len(batch) >= size:
+                    loaded = self._emit_batch(batch, history_col, loaded, total)
+                    batch = []
+                    size = self.batch_size
+            if batch:
+                loaded = self._emit_batch(batch, history_col, loaded, total)
+            if not self.isInterruptionRequested():
+                self.loaded.emit()
+        finally:
+            workbook.close()
+
+    def _emit_batch(self, batch, history_col, loaded, total):
+        histories = HistoryStore.from_json([values[history_col] for values in batch], start_row=loaded)
+        self.batch_ready.emit(batch, histories)
+        loaded += len(batch)
+        self.progress.emit(loaded, max(total, loaded))
+        return loaded
+
+
+class WorkspaceLoader(QThread):
+    """在后台线程中读取并合并文件夹中的工作簿，只解析新增或修改过的文件
+
+    调用requestInterruption()后在读完当前文件时停止，不会再发出loaded信号。
+    """
+
+    # 进度: (已读取文件数, 需要读取的文件数)
+    progress = pyqtSignal(int, int)
+    # 合并完成: WorkspaceDataset
+    loaded = pyqtSignal(object)
+    # 读取失败: 错误信息
+    failed = pyqtSignal(str)
+
+    def __init__(self, folder, cache, parent=None):
+        super().__init__(parent)
+        self.file_path = folder
+        self.cache = cache
+
+    def run(self):
+        threading.current_thread().name = 'workspace-loader'
+        try:
+            with profiling.span('workspace.load'):
+                dataset = open_workspace(self.file_path, self.cache, self._on_progress)
+            if dataset is not None and not self.isInterruptionRequested():
+                self.loaded.emit(dataset)
+        except Exception as e:
+            self.failed.emit(str(e))
+
+    def _on_progress(self, done, total):
+        self.progress.emit(done, total)
+        return self.isInterruptionRequested()
+
+
+class WorkbookReloader(QThread):
+    """文件被重新写入后，在后台线程中重新读取并与当前数据集比较
+
+    比较结果见row_diff.diff_datasets()，列变化时结果为None。
+    """
+
+    # 比较完成: (旧数据集, 新数据集, 比较结果)
+    reloaded = pyqtSignal(object, object, object)
+    # 读取失败: 错误信息
+    failed = pyqtSignal(str)
+
+    def __init__(self, dataset, cache, parent=None):
+        super().__init__(parent)
+        self.dataset = dataset
+        self.cache = cache
+
+    def run(self):
+        threading.current_thread().name = 'workbook-reloader'
+        try:
+            path = self.dataset.file_path
+            with profiling.span('reload.read'):
+                if os.path.isdir(path):
+                    dataset = open_workspace(path, self.cache)
+                else:
+                    dataset = ExcelDataset.load(path, self.cache)
+            with profiling.span('reload.diff', rows=len(dataset)):
+                diff = diff_datasets(self.dataset, dataset)
+            self.reloaded.emit(self.dataset, dataset, diff)
+        except Exception as e:
+            self.failed.emit(str(e))
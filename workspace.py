@@ -0,0 +1,161 @@
+"""工作区：把一个文件夹中的多个工作簿合并为一个数据集
+
+同一ASIN在多个文件中出现时，销量历史按日期合并去重，同一天有多个值时以较新的文件为准，
+其他列取自包含该ASIN的最新文件。文件按修改时间从旧到新排列（相同时按文件名）。
+
+合并结果和参与合并的文件清单（修改时间、大小、SHA1）保存在列式缓存中。再次打开时：
+文件都没有变化则直接读取合并结果；只新增了更新的文件时，只解析新文件并与上次结果合并；
+其他情况（文件被修改或删除）重新合并，未变化的文件仍从各自的缓存读取。
+"""
+import os
+
+import numpy as np
+import pandas as pd
+
+import profiling
+from dataset import ASIN_COLUMN, ExcelDataset
+from history_store import HistoryStore
+from workbook_cache import file_content_hash
+
+
+def is_workbook_name(name):
+    # 跳过Excel打开文件时生成的~$临时文件
+    return name.lower().endswith('.xlsx') and not name.startswith('~$')
+
+
+def scan_folder(folder):
+    """返回文件夹中的工作簿清单{文件名: {'mtime_ns', 'size'}}"""
+    files = {}
+    with os.scandir(folder) as entries:
+        for entry in entries:
+            if entry.is_file() and is_workbook_name(entry.name):
+                stat = entry.stat()
+                files[entry.name] = {'mtime_ns': stat.st_mtime_ns, 'size': stat.st_size}
+    return files
+
+
+def file_order(files):
+    """按从旧到新排列的文件名"""
+    return sorted(files, key=lambda name: (files[name]['mtime_ns'], name))
+
+
+def merge_parts(parts):
+    """合并按从旧到新排列的(DataFrame, HistoryStore)，返回合并后的(DataFrame, HistoryStore)
+
+    结果中每个ASIN一行，按首次出现在最新文件中的顺序排列；没有ASIN的行被丢弃。
+    """
+    # 从新到旧拼接，factorize得到的编号顺序即为结果的行顺序
+    newest_first = parts[::-1]
+    asins = np.concatenate([df.iloc[:, df.columns.get_loc(ASIN_COLUMN)].to_numpy(dtype=object)
+                            for df, _ in newest_first])
+    codes, uniques = pd.factorize(asins)
+
+    # 每个历史数据点所属的ASIN编号和来源文件（越新越大）
+    point_codes, point_days, point_sales, point_ranks = [], [], [], []
+    start = 0
+    for rank, (df, histories) in zip(range(len(parts) - 1, -1, -1), newest_first):
+        row_codes = codes[start:start + len(df)]
+        start += len(df)
+        lengths = np.diff(histories.offsets)
+        point_codes.append(np.repeat(row_codes, lengths))
+        point_days.append(histories.days)
+        point_sales.append(histories.sales)
+        point_ranks.append(np.full(len(histories.days), rank, dtype=np.int32))
+    point_codes = np.concatenate(point_codes)
+    days = np.concatenate(point_days)
+    sales = np.concatenate(point_sales)
+    ranks = np.concatenate(point_ranks)
+
+    # 按(ASIN, 日期, 来源)排序后，每组(ASIN, 日期)保留最后一个，即最新文件的值
+    keep = point_codes >= 0
+    point_codes, days, sales, ranks = point_codes[keep], days[keep], sales[keep], ranks[keep]
+    order = np.lexsort((ranks, days, point_codes))
+    point_codes, days, sales = point_codes[order], days[order], sales[order]
+    last = np.ones(len(days), dtype=bool)
+    last[:-1] = (point_codes[1:] != point_codes[:-1]) | (days[1:] != days[:-1])
+    point_codes, days, sales = point_codes[last], days[last], sales[last]
+
+    counts = np.bincount(point_codes, minlength=len(uniques))
+    offsets = np.zeros(len(uniques) + 1, dtype=np.int64)
+    np.cumsum(counts, out=offsets[1:])
+    histories = HistoryStore(days, sales, offsets, counts > 0)
+
+    # 其他列取自每个ASIN第一次出现的行，即最新文件中的行
+    _, first_rows = np.unique(codes, return_index=True)
+    if len(codes) and codes[first_rows[0]] < 0:
+        first_rows = first_rows[1:]
+    df = pd.concat([df for df, _ in newest_first], ignore_index=True)
+    df = df.iloc[first_rows].reset_index(drop=True)
+    return df, histories
+
+
+class WorkspaceDataset(ExcelDataset):
+    """文件夹合并得到的数据集，file_path为文件夹路径，files为参与合并的文件清单"""
+
+    def __init__(self, folder, df, histories, files):
+        super().__init__(folder, df, histories)
+        self.files = files
+
+    def is_stale(self):
+        """文件夹中的工作簿增加、删除或修改后，数据集失效"""
+        try:
+            current = scan_folder(self.file_path)
+        except OSError:
+            return True
+        return current.keys() != self.files.keys() or any(
+            (info['mtime_ns'], info['size']) != (self.files[name]['mtime_ns'], self.files[name]['size'])
+            for name, info in current.items())
+
+
+def _unchanged(old, new, path):
+    if (old['mtime_ns'], old['size']) == (new['mtime_ns'], new['size']):
+        return True
+    # 修改时间变化但内容未变（如复制、同步）时视为未变化
+    return old['size'] == new['size'] and old['sha1'] == file_content_hash(path)
+
+
+def open_workspace(folder, cache=None, progress=None):
+    """读取文件夹中的全部工作簿并合并，返回WorkspaceDataset
+
+    progress(已读取文件数, 需要读取的文件数)在每个文件读取后调用，返回True时停止读取并返回None。
+    """
+    files = scan_folder(folder)
+    if not files:
+        raise ValueError('文件夹中没有.xlsx文件')
+    previous = cache.load_workspace(folder) if cache is not None else None
+
+    # 与上次合并时的清单比较，确定需要读取的文件
+    base = None
+    pending = file_order(files)
+    if previous is not None:
+        old_files, old_df, old_histories = previous
+        unchanged = {name for name in files if name in old_files
+                     and _unchanged(old_files[name], files[name], os.path.join(folder, name))}
+        for name in unchanged:
+            files[name]['sha1'] = old_files[name]['sha1']
+        if unchanged == old_files.keys():
+            pending = [name for name in pending if name not in unchanged]
+            newest_old = max((files[name]['mtime_ns'], name) for name in unchanged)
+            # 新文件都比上次合并的文件新时，只需把新文件合并到上次的结果上
+            if all((files[name]['mtime_ns'], name) > newest_old for name in pending):
+                base = (old_df, old_histories)
+            else:
+                pending = file_order(files)
+            if not pending:
+                return WorkspaceDataset(folder, old_df, old_histories, files)
+
+    parts = [] if base is None else [base]
+    with profiling.span('workspace.read', files=len(pending)):
+        for i, name in enumerate(pending):
+            path = os.path.join(folder, name)
+            dataset = ExcelDataset.load(path, cache)
+            parts.append((dataset.df, dataset.histories))
+            if 'sha1' not in files[name]:
+                files[name]['sha1'] = file_content_hash(path)
+            if progress is not None and progress(i + 1, len(pending)):
+                return None
+    with profiling.span('workspace.merge', parts=len(parts)):
+        df, histories = merge_parts(parts)
+    if cache is not None:
+        cache.store_workspace(folder, files, df, histories)
+    return WorkspaceDataset(folder, df, histories, files)